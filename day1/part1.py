@@ -1,43 +1,170 @@
 #/usr/bin/env python3
 
+import os
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# bytes of the memory-mapped file processed at once - on a file of nothing but digits, the temporary arrays of a chunk
+# peak at about 20 bytes per byte of it (around 80 MiB), on top of the mapped pages of the file, which the OS can drop again
+NUMPY_CHUNK_SIZE = 4 * 1024 * 1024
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Process input file')
     parser.add_argument('--input_file', type=str, help='Path to the input file')
+    parser.add_argument('--numpy', action='store_true', help='Memory-map the file and find the digits with vectorized NumPy operations')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes, each summing its own chunk of the file')
     return parser.parse_args()
 
+def get_line_digits(line):
+    """ Returns the number made of the first and last digit of a line."""
+
+    first_digit = None
+    last_digit = None
+    new_number = 0
+
+    # Iterate through each digit in the line
+    for current_pointer in range(len(line)):
+
+        if line[current_pointer].isdigit() and first_digit is None:
+            first_digit = int(line[current_pointer])
+
+        # Find the last digit
+        if line[-current_pointer-1].isdigit() and last_digit is None:
+            last_digit = int(line[-current_pointer-1])
+
+        # Combine and break if both digits are found
+        if first_digit is not None and last_digit is not None:
+            new_number = f"{first_digit}{last_digit}"
+            new_number = int(new_number)
+            break
+
+    return new_number
+
+def get_chunk_boundaries(input_file, num_chunks):
+    """ Splits the file into num_chunks byte ranges (start, end) that begin and end on line boundaries. """
+
+    file_size = os.path.getsize(input_file)
+
+    offsets = [0]
+    with open(input_file, 'rb') as file:
+        for chunk_idx in range(1, num_chunks):
+            file.seek(max(file_size * chunk_idx // num_chunks, offsets[-1]))
+
+            # move to the start of the next line, unless we are already there
+            if file.tell() > 0:
+                file.seek(file.tell() - 1)
+                file.readline()
+            offsets.append(file.tell())
+    offsets.append(file_size)
+
+    return [(start, end) for start, end in zip(offsets, offsets[1:]) if start < end]
+
+def sum_file_range(input_file, start, end):
+    """ Returns the sum of the calibration values of the lines in the byte range [start, end) of the file. """
+
+    total_sum = 0
+    with open(input_file, 'rb') as file:
+        file.seek(start)
+        position = start
+        while position < end:
+            line = file.readline()
+            if not line:
+                break
+            position += len(line)
+
+            total_sum += get_line_digits(line.decode().strip())
+
+    return total_sum
+
+def sum_file_parallel(input_file, workers):
+    """ Sums the calibration values of the file with a pool of worker processes, each handling a chunk of lines. """
+
+    # a few chunks per worker, so a slow chunk does not keep the other workers idle
+    chunks = get_chunk_boundaries(input_file, workers * 4)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(sum_file_range, input_file, start, end) for start, end in chunks]
+        return sum(future.result() for future in futures)
+
+def sum_buffer_digits(buffer):
+    """ Returns the sum of the calibration values in a uint8 buffer holding whole lines.
+    We find every digit position, assign it to its line by counting the newlines before it,
+    and then pick the first and the last digit of each line where the line number changes.
+    The positions and line numbers are int32 offsets within the buffer (so a buffer must stay below 2 GiB), and the digits stay uint8.
+    """
+
+    digit_positions = np.flatnonzero((buffer >= ord("0")) & (buffer <= ord("9"))).astype(np.int32)
+    if digit_positions.size == 0:
+        return 0
+
+    newline_positions = np.flatnonzero(buffer == ord("\n")).astype(np.int32)
+    digit_lines = np.searchsorted(newline_positions, digit_positions).astype(np.int32)
+    digit_values = buffer[digit_positions] - ord("0")
+
+    line_changes = digit_lines[1:] != digit_lines[:-1]
+    is_first = np.concatenate(([True], line_changes))
+    is_last = np.concatenate((line_changes, [True]))
+
+    return int(10 * digit_values[is_first].sum(dtype=np.int64) + digit_values[is_last].sum(dtype=np.int64))
+
+def iter_line_chunks(buffer, chunk_size=NUMPY_CHUNK_SIZE):
+    """ Yields consecutive slices of the buffer of about chunk_size bytes, each ending on a newline (or at the end of the buffer). """
+
+    start = 0
+    while start < buffer.size:
+        end = min(start + chunk_size, buffer.size)
+
+        # cut the chunk after its last newline, growing it if a single line is longer than the chunk
+        while end < buffer.size:
+            newline_positions = np.flatnonzero(buffer[start:end] == ord("\n"))
+            if newline_positions.size:
+                end = start + newline_positions[-1] + 1
+                break
+            end = min(start + 2 * (end - start), buffer.size)
+
+        yield buffer[start:end]
+        start = end
+
+def sum_file_numpy(input_file, chunk_size=NUMPY_CHUNK_SIZE):
+    """ Sums the calibration values of a memory-mapped file chunk by chunk, so files larger than the memory work too. """
+
+    if np is None:
+        raise ImportError("The --numpy mode requires numpy to be installed")
+
+    if os.path.getsize(input_file) == 0:
+        return 0
+
+    buffer = np.memmap(input_file, dtype=np.uint8, mode='r')
+
+    return sum(sum_buffer_digits(chunk) for chunk in iter_line_chunks(buffer, chunk_size))
+
 def main():
     args = parse_arguments()
 
+    if args.numpy:
+        total_sum = sum_file_numpy(args.input_file)
+        print(f"Sum of all digits: {total_sum}")
+        return
+
+    if args.workers > 1:
+        total_sum = sum_file_parallel(args.input_file, args.workers)
+        print(f"Sum of all digits: {total_sum}")
+        return
+
     total_sum = 0
 
     # Use args.input_file to access the path of the input file
     with open(args.input_file, 'r') as file:
         for line in file:
             line = line.strip()
-            first_digit = None
-            last_digit = None
-            new_number = 0
-
-            # Iterate through each digit in the line
-            for current_pointer in range(len(line)):
-
-                if line[current_pointer].isdigit() and first_digit is None:
-                    first_digit = int(line[current_pointer])
-
-                # Find the last digit
-                if line[-current_pointer-1].isdigit() and last_digit is None:
-                    last_digit = int(line[-current_pointer-1])
-
-                # Combine and break if both digits are found
-                if first_digit is not None and last_digit is not None:
-                    new_number = f"{first_digit}{last_digit}"
-                    new_number = int(new_number)
-                    break
-            
+
             # Collect the sum of all digits
-            total_sum += new_number
+            total_sum += get_line_digits(line)
 
     # Print the sum
     print(f"Sum of all digits: {total_sum}")
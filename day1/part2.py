@@ -1,26 +1,44 @@
 #/usr/bin/env python3
 
+import os
+import time
 import argparse
+from functools import partial
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+DIGITS_HASH = {
+    "one": 1,
+    "two": 2,
+    "three": 3,
+    "four": 4,
+    "five": 5,
+    "six": 6,
+    "seven": 7,
+    "eight": 8,
+    "nine": 9
+}
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Process input file')
     parser.add_argument('--input_file', type=str, help='Path to the input file')
-    return parser.parse_args()
+    parser.add_argument('--search', type=str, choices=['single_pass', 'two_ended'], default='single_pass', help='Scan each line once, or search from both ends and stop at the first hit')
+    parser.add_argument('--vocabulary', type=str, nargs='+', help='Digit words as word=digit, replacing the English words (e.g. zero=0 eins=1)')
+    parser.add_argument('--vocabulary_file', type=str, help='File with one "word digit" pair per line, replacing the English words')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes, each summing its own chunk of the file')
+    parser.add_argument('--benchmark', action='store_true', help='Compare the throughput of the automaton against the line conversion')
+    args = parser.parse_args()
+
+    # a bad vocabulary entry is a usage error, reported with the entry itself
+    try:
+        args.digits_hash = parse_vocabulary(args.vocabulary, args.vocabulary_file)
+    except ValueError as error:
+        parser.error(str(error))
+
+    return args
 
 def convert_line(line):
     """ Converts a line from text to digits from the left to right. Each line is a collection of words and digits with no space in-between. """
-    digits_hash = {
-        "one": 1,
-        "two": 2,
-        "three": 3,
-        "four": 4,
-        "five": 5,
-        "six": 6,
-        "seven": 7,
-        "eight": 8,
-        "nine": 9
-    }
-
     converted_line = ""
     to_convert = ""
 
@@ -42,7 +60,7 @@ def convert_line(line):
             to_convert += character_l
 
             # attempt to replace the word with a digit
-            for word, digit in digits_hash.items():
+            for word, digit in DIGITS_HASH.items():
                 if word in to_convert:
                     converted_result = to_convert.replace(word, str(digit))
                     converted_line += str(converted_result)
@@ -51,8 +69,9 @@ def convert_line(line):
 
     return converted_line
 
-def get_line_digits(line):
-    """ Returns the first and last digit of a line."""
+def get_line_digits_by_conversion(line):
+    """ Returns the first and last digit of a line by converting the whole line first.
+    This is the original implementation, kept as the baseline for the benchmark. """
 
     # Substitute words with digits
     converted_line = convert_line(line)
@@ -79,6 +98,238 @@ def get_line_digits(line):
 
     return new_number
 
+def build_digit_matcher(digits_hash, reverse=False):
+    """ Compiles the digits and the digit words into a single Aho-Corasick automaton.
+    The automaton is flattened into a DFA - a list of transition dicts (one per state) - so scanning a line costs one dict lookup per character.
+    Each state also holds the matches that end in it as (length, digit) tuples, which lets us recover where a match started.
+    Matches can overlap, e.g. "oneight" reports both "one" and "eight".
+    With reverse=True the words are compiled backwards, so the automaton can scan a line from its end.
+    """
+
+    tokens = {str(digit): digit for digit in range(10)}
+    tokens.update({word.lower(): digit for word, digit in digits_hash.items()})
+    if reverse:
+        tokens = {word[::-1]: digit for word, digit in tokens.items()}
+
+    # Build the trie of all tokens
+    goto = [{}]
+    outputs = [[]]
+    for word, digit in tokens.items():
+        state = 0
+        for character in word:
+            if character not in goto[state]:
+                goto.append({})
+                outputs.append([])
+                goto[state][character] = len(goto) - 1
+            state = goto[state][character]
+        outputs[state].append((len(word), digit))
+
+    # Walk the trie breadth first, so the failure state of every node is complete before we visit the node
+    fail = [0] * len(goto)
+    transitions = [dict(goto[0])] + [None] * (len(goto) - 1)
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+
+        # inherit the transitions and the matches of the longest proper suffix
+        transitions[state] = {**transitions[fail[state]], **goto[state]}
+        outputs[state] = outputs[state] + outputs[fail[state]]
+
+        for character, next_state in goto[state].items():
+            if state != 0:
+                fail[next_state] = transitions[fail[state]].get(character, 0)
+            queue.append(next_state)
+
+    # the words are matched case insensitively, without lowering the line
+    for state_transitions in transitions:
+        state_transitions.update({character.upper(): next_state for character, next_state in state_transitions.items()})
+
+    max_length = max(len(word) for word in tokens)
+
+    return transitions, [tuple(output) for output in outputs], max_length
+
+DIGIT_MATCHER = build_digit_matcher(DIGITS_HASH)
+REVERSED_DIGIT_MATCHER = build_digit_matcher(DIGITS_HASH, reverse=True)
+
+def find_first_last_digits(line, matcher=DIGIT_MATCHER):
+    """ Returns the first and the last digit of a line in a single pass over the automaton, or (None, None) if there are none. """
+
+    transitions, outputs, _ = matcher
+
+    first_start = None
+    first_length = 0
+    first_digit = None
+    last_start = None
+    last_length = 0
+    last_digit = None
+
+    state = 0
+    for character_idx, character in enumerate(line):
+        state = transitions[state].get(character, 0)
+        for length, digit in outputs[state]:
+            start = character_idx - length + 1
+
+            # when two words start at the same place (e.g. "seven" and "seventeen"), the longer one wins
+            if first_start is None or start < first_start or (start == first_start and length > first_length):
+                first_start = start
+                first_length = length
+                first_digit = digit
+            if last_start is None or start > last_start or (start == last_start and length > last_length):
+                last_start = start
+                last_length = length
+                last_digit = digit
+
+    return first_digit, last_digit
+
+def find_first_digit(line, matcher=DIGIT_MATCHER):
+    """ Scans the line from the left and stops as soon as the first digit is known, or returns None if there is none.
+    A match is reported at its end, so after the first match we look at most max_length more characters for a match that starts earlier.
+    """
+
+    transitions, outputs, max_length = matcher
+
+    first_start = None
+    first_length = 0
+    first_digit = None
+
+    state = 0
+    for character_idx, character in enumerate(line):
+        # no match ending from here on can start before (or as a longer word at) the one we have
+        if first_start is not None and character_idx - max_length + 1 > first_start:
+            break
+
+        state = transitions[state].get(character, 0)
+        for length, digit in outputs[state]:
+            start = character_idx - length + 1
+            if first_start is None or start < first_start or (start == first_start and length > first_length):
+                first_start = start
+                first_length = length
+                first_digit = digit
+
+    return first_digit
+
+def find_last_digit(line, reversed_matcher=REVERSED_DIGIT_MATCHER):
+    """ Scans the line from the right with the reversed automaton and stops at the first match, or returns None if there is none.
+    The first match of the reversed words is the one that starts last in the line, and its longest word comes first in the outputs.
+    """
+
+    transitions, outputs, _ = reversed_matcher
+
+    state = 0
+    for character_idx in range(len(line) - 1, -1, -1):
+        state = transitions[state].get(line[character_idx], 0)
+        if outputs[state]:
+            return outputs[state][0][1]
+
+    return None
+
+def get_line_digits(line, matcher=DIGIT_MATCHER):
+    """ Returns the first and last digit of a line."""
+
+    first_digit, last_digit = find_first_last_digits(line, matcher)
+    if first_digit is None:
+        return 0
+
+    return first_digit * 10 + last_digit
+
+def get_line_digits_two_ended(line, matcher=DIGIT_MATCHER, reversed_matcher=REVERSED_DIGIT_MATCHER):
+    """ Returns the first and last digit of a line, searching from both ends.
+    The cost depends on how far the first and last digits are from the ends of the line, not on the length of the line.
+    """
+
+    first_digit = find_first_digit(line, matcher)
+    if first_digit is None:
+        return 0
+
+    return first_digit * 10 + find_last_digit(line, reversed_matcher)
+
+def compile_line_digits(search="single_pass", digits_hash=DIGITS_HASH):
+    """ Compiles the vocabulary once and returns a function that computes the calibration value of a line with the chosen search.
+    All lines then share the same automaton, and since it is a DFA the cost per line does not depend on the size of the vocabulary.
+    """
+
+    matcher = build_digit_matcher(digits_hash)
+    if search == "two_ended":
+        return partial(get_line_digits_two_ended, matcher=matcher, reversed_matcher=build_digit_matcher(digits_hash, reverse=True))
+
+    return partial(get_line_digits, matcher=matcher)
+
+def parse_vocabulary(vocabulary, vocabulary_file):
+    """ Returns the word -> digit dictionary given on the command line, or the English digit words if there is none.
+    Entries look like "word=digit" or "word digit", where the word is made of letters and the digit is a single 0-9,
+    since a calibration value is always made of two single digits. Raises ValueError, naming the entry, for anything else.
+    """
+
+    entries = list(vocabulary or [])
+    if vocabulary_file is not None:
+        with open(vocabulary_file, 'r') as file:
+            entries += [line.strip() for line in file if line.strip() != ""]
+
+    if not entries:
+        return DIGITS_HASH
+
+    digits_hash = {}
+    for entry in entries:
+        tokens = entry.replace("=", " ").split()
+        if len(tokens) != 2 or not tokens[0].isalpha():
+            raise ValueError(f"Invalid vocabulary entry {entry!r}: expected word=digit")
+
+        word, digit = tokens
+        if len(digit) != 1 or digit not in "0123456789":
+            raise ValueError(f"Invalid vocabulary entry {entry!r}: the digit must be a single 0-9")
+
+        digits_hash[word.lower()] = int(digit)
+
+    return digits_hash
+
+def get_chunk_boundaries(input_file, num_chunks):
+    """ Splits the file into num_chunks byte ranges (start, end) that begin and end on line boundaries. """
+
+    file_size = os.path.getsize(input_file)
+
+    offsets = [0]
+    with open(input_file, 'rb') as file:
+        for chunk_idx in range(1, num_chunks):
+            file.seek(max(file_size * chunk_idx // num_chunks, offsets[-1]))
+
+            # move to the start of the next line, unless we are already there
+            if file.tell() > 0:
+                file.seek(file.tell() - 1)
+                file.readline()
+            offsets.append(file.tell())
+    offsets.append(file_size)
+
+    return [(start, end) for start, end in zip(offsets, offsets[1:]) if start < end]
+
+def sum_file_range(input_file, start, end, search="single_pass", digits_hash=DIGITS_HASH):
+    """ Returns the sum of the calibration values of the lines in the byte range [start, end) of the file. """
+
+    get_digits = compile_line_digits(search, digits_hash)
+
+    total_sum = 0
+    with open(input_file, 'rb') as file:
+        file.seek(start)
+        position = start
+        while position < end:
+            line = file.readline()
+            if not line:
+                break
+            position += len(line)
+
+            total_sum += get_digits(line.decode().strip())
+
+    return total_sum
+
+def sum_file_parallel(input_file, workers, search="single_pass", digits_hash=DIGITS_HASH):
+    """ Sums the calibration values of the file with a pool of worker processes, each handling a chunk of lines. """
+
+    # a few chunks per worker, so a slow chunk does not keep the other workers idle
+    chunks = get_chunk_boundaries(input_file, workers * 4)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(sum_file_range, input_file, start, end, search, digits_hash) for start, end in chunks]
+        return sum(future.result() for future in futures)
+
 def test_conversion():
     line = "zoneight234"
     actual_result = convert_line(line)
@@ -96,9 +347,67 @@ def test_line_digits():
 
         assert actual_result == expected_result, f"Expected {expected_result}, got {actual_result}"
 
+def test_line_digits_match_conversion():
+    lines = ["zoneight234", "br7oneeight2", "two1nine", "xtwone3four", "7pqrstsixteen", "oneight", "ONEighT", "xSEVENine", "sevenine", "abc", "", "4"]
+
+    for line in lines:
+        expected_result = get_line_digits_by_conversion(line)
+
+        for get_digits in [get_line_digits, get_line_digits_two_ended]:
+            actual_result = get_digits(line)
+            assert actual_result == expected_result, f"Line {line}: expected {expected_result}, got {actual_result}"
+
+def test_custom_vocabulary():
+    digits_hash = {"zero": 0, "one": 1, "seven": 7, "seventeen": 9, "een": 3, "eins": 1, "zwei": 2}
+    lines = ["xzerone", "seventeenx", "aseveneeinsb", "zweins", "qq", "4seventee"]
+    expected_results = [1, 93, 71, 21, 0, 47]
+
+    for search in ["single_pass", "two_ended"]:
+        get_digits = compile_line_digits(search, digits_hash)
+        for line, expected_result in zip(lines, expected_results):
+            actual_result = get_digits(line)
+            assert actual_result == expected_result, f"Line {line} ({search}): expected {expected_result}, got {actual_result}"
+
+    assert parse_vocabulary(["zero=0", "Eins 1"], None) == {"zero": 0, "eins": 1}
+    for entry in ["ten=10", "zero", "zero=", "two=2=2", "2=2", "nine=9x", "minus=-1"]:
+        try:
+            parse_vocabulary([entry], None)
+        except ValueError as error:
+            assert repr(entry) in str(error)
+        else:
+            assert False, f"Entry {entry!r} should have been rejected"
+
+def benchmark_line_digits(lines):
+    """ Times the automaton against the original conversion over the same lines and prints the throughput of both. """
+
+    total_bytes = sum(len(line) for line in lines)
+
+    for name, get_digits in [("conversion", get_line_digits_by_conversion), ("automaton", get_line_digits), ("two ended", get_line_digits_two_ended)]:
+        start_time = time.perf_counter()
+        total_sum = 0
+        for line in lines:
+            total_sum += get_digits(line)
+        elapsed = time.perf_counter() - start_time
+
+        print(f"{name}: sum {total_sum}, {elapsed:.3f}s, {total_bytes / elapsed / 1e6:.2f} MB/s")
+
 def main():
     args = parse_arguments()
 
+    if args.benchmark:
+        with open(args.input_file, 'r') as file:
+            benchmark_line_digits([line.strip() for line in file])
+        return
+
+    digits_hash = args.digits_hash
+
+    if args.workers > 1:
+        total_sum = sum_file_parallel(args.input_file, args.workers, args.search, digits_hash)
+        print(f"Sum of all digits: {total_sum}")
+        return
+
+    get_digits = compile_line_digits(args.search, digits_hash)
+
     total_sum = 0
 
     # Use args.input_file to access the path of the input file
@@ -106,7 +415,7 @@ def main():
         for line in file:
             line = line.strip()
 
-            two_digit_number = get_line_digits(line)
+            two_digit_number = get_digits(line)
             
             # Collect the sum of all digits
             total_sum += two_digit_number
@@ -117,4 +426,6 @@ def main():
 if __name__ == "__main__":
     test_conversion()
     test_line_digits()
+    test_line_digits_match_conversion()
+    test_custom_vocabulary()
     main()
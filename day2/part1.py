@@ -1,29 +1,70 @@
 #/usr/bin/env python3
 
+import re
+import math
+import time
 import argparse
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# the colors every game starts with, any other color gets the next free index when we first see it
+DEFAULT_COLORS = ["red", "green", "blue"]
+
+# one scan over the whole input picks up both the game ids and the cube counts
+GAME_PATTERN = re.compile(rb"Game (\d+)|(\d+) ([a-z]+)")
+CUBE_PATTERN = re.compile(r"(\d+) ([a-z]+)")
+
+# the dense prefix table is only built up to this many cells (32 MiB), above it the queries are answered with a sweep
+THRESHOLD_TABLE_MAX_CELLS = 1 << 22
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Process input file')
     parser.add_argument('--input_file', type=str, help='Path to the input file')
+    parser.add_argument('--columnar', action='store_true', help='Parse the whole file into columns and reduce them with NumPy')
+    parser.add_argument('--queries_file', type=str, help='File with one "red green blue" limit per line, each answered with the sum of possible game ids')
+    parser.add_argument('--benchmark', action='store_true', help='Time the parse and the reduce phases of the columnar mode separately')
     return parser.parse_args()
 
+def intern_color(color, color_index):
+    """ Returns the integer index of a color, giving it the next free index the first time we see it. """
+
+    color_idx = color_index.get(color)
+    if color_idx is None:
+        color_idx = len(color_index)
+        color_index[color] = color_idx
+
+    return color_idx
+
+def fill_max_per_game(line, color_index, maxima):
+    """ Writes the maximum number of cubes per color of this game into maxima, an array indexed by color that is reused across games.
+    Colors we have not seen before are interned into color_index, and maxima grows by one slot for each of them.
+    """
+
+    for color_idx in range(len(maxima)):
+        maxima[color_idx] = 0
+
+    for number, color in CUBE_PATTERN.findall(line):
+        color_idx = intern_color(color, color_index)
+        if color_idx == len(maxima):
+            maxima.append(0)
+
+        number = int(number)
+        if number > maxima[color_idx]:
+            maxima[color_idx] = number
+
+    return maxima
+
 def get_max_per_game(line):
     """ Returns the maximum number of cubes in this game given a line. """
 
-    all_cube_numbers = {
-        "red": 0,
-        "green": 0,
-        "blue": 0
-    }
-    iterations = line.split(";")
-    for iteration in iterations:
-        cubes = iteration.split(",")
-        for cube in cubes:
-            number, color = cube.strip().split(" ")
-            if color in all_cube_numbers:
-                all_cube_numbers[color] = max(all_cube_numbers[color], int(number))
+    color_index = {color: color_idx for color_idx, color in enumerate(DEFAULT_COLORS)}
+    maxima = fill_max_per_game(line, color_index, array('q', bytes(8 * len(color_index))))
 
-    return all_cube_numbers
+    return {color: maxima[color_idx] for color, color_idx in color_index.items()}
 
 def test_get_max_per_game():
     game = "4 blue, 4 red, 16 green; 14 green, 5 red; 1 blue, 3 red, 5 green"
@@ -41,6 +82,236 @@ def parse_game_id(line):
 
     return int(line.split(":")[0].strip().split(" ")[1])
 
+def parse_games_columnar(data):
+    """ Parses the whole input (as bytes) in a single scan into a column of game ids and one column of max cubes per color.
+    Returns (game_ids, color_index, color_columns), where color_index maps each color to its column in color_columns.
+    A color we see for the first time gets a new column, filled with zeros for the games before it.
+    """
+
+    game_ids = array('q')
+    color_index = {color.encode(): color_idx for color_idx, color in enumerate(DEFAULT_COLORS)}
+    color_columns = [array('q') for _ in color_index]
+
+    # walk the matches one by one, so the list of every token in the file is never built
+    for match in GAME_PATTERN.finditer(data):
+        # a new game starts a new row in every column
+        if match.lastindex == 1:
+            game_ids.append(int(match.group(1)))
+            for column in color_columns:
+                column.append(0)
+            continue
+
+        number, color = match.group(2, 3)
+        color_idx = intern_color(color, color_index)
+        if color_idx == len(color_columns):
+            color_columns.append(array('q', bytes(8 * len(game_ids))))
+
+        column = color_columns[color_idx]
+        number = int(number)
+        if number > column[-1]:
+            column[-1] = number
+
+    return game_ids, {color.decode(): color_idx for color, color_idx in color_index.items()}, color_columns
+
+def sum_possible_games(columns, max_cubes):
+    """ Returns the sum of the ids of the games that are possible with max_cubes, as a vectorized reduction over the columns. """
+
+    game_ids, color_index, color_columns = columns
+
+    # colors that are not in max_cubes are not in the bag at all
+    possible = np.ones(len(game_ids), dtype=bool)
+    for color, color_idx in color_index.items():
+        possible &= np.frombuffer(color_columns[color_idx], dtype=np.int64) <= max_cubes.get(color, 0)
+
+    return int(np.frombuffer(game_ids, dtype=np.int64)[possible].sum())
+
+def build_threshold_index(columns, max_cells=THRESHOLD_TABLE_MAX_CELLS):
+    """ Builds the index the (red, green, blue) limit queries are answered from. Returns (axes, table, games).
+    When the games share few distinct maxima, table is a 3-D prefix sum over the games, so every query is a single lookup.
+    Each color axis only holds the distinct maxima seen in the games (plus a leading zero slot for limits below all of them),
+    so the table has (distinct red + 1) * (distinct green + 1) * (distinct blue + 1) cells - up to the cube of the number of games.
+    Above max_cells, table is None and the queries are answered from the games columns with a sweep (see sweep_possible_games).
+    Games with cubes of any other color are never possible, so they are left out of the index.
+    """
+
+    game_ids, color_index, color_columns = columns
+    game_ids = np.frombuffer(game_ids, dtype=np.int64)
+
+    query_columns = [np.frombuffer(color_columns[color_index[color]], dtype=np.int64) for color in DEFAULT_COLORS]
+    other_colors = [color_idx for color, color_idx in color_index.items() if color not in DEFAULT_COLORS]
+    if other_colors:
+        only_default_colors = ~np.any([np.frombuffer(color_columns[color_idx], dtype=np.int64) > 0 for color_idx in other_colors], axis=0)
+        game_ids = game_ids[only_default_colors]
+        query_columns = [values[only_default_colors] for values in query_columns]
+
+    axes = [np.unique(values) for values in query_columns]
+    games = (query_columns, game_ids)
+
+    if math.prod(len(axis) + 1 for axis in axes) > max_cells:
+        return axes, None, games
+
+    table = np.zeros([len(axis) + 1 for axis in axes], dtype=np.int64)
+
+    # drop every game into the cell of its own maxima, then accumulate along each color
+    cells = tuple(np.searchsorted(axis, values) + 1 for axis, values in zip(axes, query_columns))
+    np.add.at(table, cells, game_ids)
+    for axis_idx in range(3):
+        np.cumsum(table, axis=axis_idx, out=table)
+
+    return axes, table, games
+
+def sweep_possible_games(games, queries):
+    """ Answers all the queries at once, with memory linear in the number of games and queries.
+    Games and queries are put in one order by red (a game before a query with the same red), so a game can only count for the queries after it.
+    We split that order in halves, recursively: the games of the first half count for the queries of the second half
+    when their green and blue are both within the limits, which we find by walking both halves by green with a Fenwick tree over the blue ranks.
+    Every game meets every query in exactly one split, so this takes O((games + queries) log^2) time.
+    """
+
+    (reds, greens, blues), game_ids = games
+    blue_axis = np.unique(blues)
+
+    is_query = np.concatenate((np.zeros(len(game_ids), dtype=bool), np.ones(len(queries), dtype=bool)))
+    order = np.lexsort((is_query, np.concatenate((reds, queries[:, 0]))))
+
+    green = np.concatenate((greens, queries[:, 1]))[order].tolist()
+    # games sit at the rank of their blue, queries sum everything up to the rank of their limit
+    blue_rank = np.concatenate((np.searchsorted(blue_axis, blues) + 1, np.searchsorted(blue_axis, queries[:, 2], side='right')))[order].tolist()
+    # the game id for games, the position in queries for queries
+    value = np.concatenate((game_ids, np.arange(len(queries), dtype=np.int64)))[order].tolist()
+    is_query = is_query[order].tolist()
+
+    tree = [0] * (len(blue_axis) + 1)
+    results = [0] * len(queries)
+
+    def add(rank, amount):
+        while rank < len(tree):
+            tree[rank] += amount
+            rank += rank & -rank
+
+    def prefix_sum(rank):
+        total = 0
+        while rank > 0:
+            total += tree[rank]
+            rank -= rank & -rank
+        return total
+
+    def solve(lo, hi):
+        if hi - lo < 2:
+            return
+
+        mid = (lo + hi) // 2
+        solve(lo, mid)
+        solve(mid, hi)
+
+        left_games = sorted((green[event], event) for event in range(lo, mid) if not is_query[event])
+        right_queries = sorted((green[event], event) for event in range(mid, hi) if is_query[event])
+
+        game_idx = 0
+        for query_green, query_event in right_queries:
+            while game_idx < len(left_games) and left_games[game_idx][0] <= query_green:
+                game_event = left_games[game_idx][1]
+                add(blue_rank[game_event], value[game_event])
+                game_idx += 1
+            results[value[query_event]] += prefix_sum(blue_rank[query_event])
+
+        # take the games out again, so the tree is empty for the next split
+        for _, game_event in left_games[:game_idx]:
+            add(blue_rank[game_event], -value[game_event])
+
+    solve(0, len(green))
+
+    return np.array(results, dtype=np.int64)
+
+def query_possible_games(index, queries):
+    """ Returns, for each (red, green, blue) limit in queries, the sum of the ids of the games that are possible with it.
+    With the dense table, every query costs a binary search per color and one table lookup, independent of the number of games.
+    """
+
+    axes, table, games = index
+    queries = np.asarray(queries, dtype=np.int64).reshape(-1, 3)
+
+    if table is None:
+        return sweep_possible_games(games, queries)
+
+    cells = tuple(np.searchsorted(axis, queries[:, axis_idx], side='right') for axis_idx, axis in enumerate(axes))
+
+    return table[cells]
+
+def read_queries(queries_file):
+    """ Reads one "red green blue" limit per line. """
+
+    with open(queries_file, 'r') as file:
+        return [[int(n) for n in line.split()] for line in file if line.strip() != ""]
+
+def test_columnar():
+    data = b"""Game 1: 3 blue, 4 red; 1 red, 2 green, 6 blue; 2 green
+Game 2: 1 blue, 2 green; 3 green, 4 blue, 1 red; 1 green, 1 blue
+Game 3: 8 green, 6 blue, 20 red; 5 blue, 4 red, 13 green; 5 green, 1 red
+Game 4: 1 green, 3 red, 6 blue; 3 green, 6 red; 3 green, 15 blue, 14 red
+Game 5: 6 red, 1 blue, 3 green; 2 blue, 1 red, 2 green
+"""
+    columns = parse_games_columnar(data)
+
+    assert list(columns[0]) == [1, 2, 3, 4, 5]
+    assert list(columns[2][columns[1]["red"]]) == [4, 1, 20, 14, 6]
+    assert sum_possible_games(columns, {"red": 12, "green": 13, "blue": 14}) == 8
+
+    queries = [(12, 13, 14), (0, 0, 0), (100, 100, 100), (4, 3, 6), (4, 2, 6), (20, 13, 6), (6, 3, 2)]
+    # the dense table and, with no room for it, the sweep
+    for max_cells in [THRESHOLD_TABLE_MAX_CELLS, 0]:
+        index = build_threshold_index(columns, max_cells)
+        for query, actual_result in zip(queries, query_possible_games(index, queries)):
+            expected_result = sum_possible_games(columns, dict(zip(["red", "green", "blue"], query)))
+            assert actual_result == expected_result, f"Query {query}: expected {expected_result}, got {actual_result}"
+
+def test_many_distinct_maxima():
+    rng = np.random.default_rng(0)
+    num_games = 5000
+    maxima = rng.integers(0, 2000, size=(num_games, 3))
+    data = "".join(f"Game {game_id}: {red} red, {green} green; {blue} blue\n" for game_id, (red, green, blue) in enumerate(maxima.tolist(), 1)).encode()
+    columns = parse_games_columnar(data)
+
+    # a dense table would need billions of cells here
+    index = build_threshold_index(columns)
+    assert index[1] is None
+
+    queries = rng.integers(0, 2100, size=(500, 3))
+    for query, actual_result in zip(queries.tolist(), query_possible_games(index, queries)):
+        expected_result = sum_possible_games(columns, dict(zip(["red", "green", "blue"], query)))
+        assert actual_result == expected_result, f"Query {query}: expected {expected_result}, got {actual_result}"
+
+def test_dynamic_colors():
+    assert get_max_per_game("2 yellow, 3 red; 1 blue, 1 green") == {"red": 3, "green": 1, "blue": 1, "yellow": 2}
+
+    columns = parse_games_columnar(b"Game 1: 1 red, 1 green, 1 blue\nGame 2: 2 yellow, 3 red; 1 blue, 1 green\nGame 3: 5 red\n")
+
+    assert list(columns[2][columns[1]["yellow"]]) == [0, 2, 0]
+    assert sum_possible_games(columns, {"red": 12, "green": 13, "blue": 14}) == 4
+    assert sum_possible_games(columns, {"red": 12, "green": 13, "blue": 14, "yellow": 2}) == 6
+    assert list(query_possible_games(build_threshold_index(columns), [(12, 13, 14)])) == [4]
+    assert list(query_possible_games(build_threshold_index(columns, 0), [(12, 13, 14)])) == [4]
+
+def run_columnar(input_file, max_cubes, benchmark=False):
+    """ Answers the puzzle with the columnar parser, printing the time of each phase if benchmark is set. """
+
+    if np is None:
+        raise ImportError("The --columnar mode requires numpy to be installed")
+
+    start_time = time.perf_counter()
+    with open(input_file, 'rb') as file:
+        columns = parse_games_columnar(file.read())
+    parse_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    result = sum_possible_games(columns, max_cubes)
+    reduce_time = time.perf_counter() - start_time
+
+    if benchmark:
+        print(f"Parsed {len(columns[0])} games in {parse_time:.3f}s, reduced in {reduce_time:.3f}s")
+
+    return result
+
 def main():
     args = parse_arguments()
     max_cubes = {
@@ -49,8 +320,30 @@ def main():
         "blue": 14
     }
 
+    if args.queries_file:
+        if np is None:
+            raise ImportError("The --queries_file mode requires numpy to be installed")
+
+        with open(args.input_file, 'rb') as file:
+            index = build_threshold_index(parse_games_columnar(file.read()))
+
+        queries = read_queries(args.queries_file)
+        for query, possible_games_sum in zip(queries, query_possible_games(index, queries)):
+            print(f"Sum of possible games for {query[0]} red, {query[1]} green, {query[2]} blue: {possible_games_sum}")
+        return
+
+    if args.columnar or args.benchmark:
+        possible_games_sum = run_columnar(args.input_file, max_cubes, args.benchmark)
+        print(f"Sum of possible games: {possible_games_sum}")
+        return
+
     possible_games_sum = 0
 
+    # a single array of maxima and limits per color is reused for every game
+    color_index = {color: color_idx for color_idx, color in enumerate(DEFAULT_COLORS)}
+    get_number_of_cubes = array('q', bytes(8 * len(color_index)))
+    limits = array('q', [max_cubes.get(color, 0) for color in color_index])
+
     # Use args.input_file to access the path of the input file
     with open(args.input_file, 'r') as file:
         for line in file:
@@ -59,9 +352,13 @@ def main():
             game_id = parse_game_id(line)
 
             line_with_cubes_only = line.split(":")[1].strip()
-            get_number_of_cubes = get_max_per_game(line_with_cubes_only)
+            fill_max_per_game(line_with_cubes_only, color_index, get_number_of_cubes)
+
+            # colors that are not in max_cubes are not in the bag at all
+            if len(limits) < len(get_number_of_cubes):
+                limits = array('q', [max_cubes.get(color, 0) for color in color_index])
 
-            if get_number_of_cubes["red"] <= max_cubes["red"] and get_number_of_cubes["green"] <= max_cubes["green"] and get_number_of_cubes["blue"] <= max_cubes["blue"]:
+            if all(number <= limit for number, limit in zip(get_number_of_cubes, limits)):
                 possible_games_sum += game_id
             else:
                 continue
@@ -69,4 +366,10 @@ def main():
     print(f"Sum of possible games: {possible_games_sum}")
 
 if __name__ == "__main__":
+    test_get_max_per_game()
+    # the columnar mode needs numpy
+    if np is not None:
+        test_columnar()
+        test_dynamic_colors()
+        test_many_distinct_maxima()
     main()
\ No newline at end of file
@@ -1,29 +1,66 @@
 #/usr/bin/env python3
 
+import re
+import math
+import time
 import argparse
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# the colors every game starts with, any other color gets the next free index when we first see it
+DEFAULT_COLORS = ["red", "green", "blue"]
+
+# one scan over the whole input picks up both the game ids and the cube counts
+GAME_PATTERN = re.compile(rb"Game (\d+)|(\d+) ([a-z]+)")
+CUBE_PATTERN = re.compile(r"(\d+) ([a-z]+)")
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Process input file')
     parser.add_argument('--input_file', type=str, help='Path to the input file')
+    parser.add_argument('--columnar', action='store_true', help='Parse the whole file into columns and reduce them with NumPy')
+    parser.add_argument('--benchmark', action='store_true', help='Time the parse and the reduce phases of the columnar mode separately')
     return parser.parse_args()
 
+def intern_color(color, color_index):
+    """ Returns the integer index of a color, giving it the next free index the first time we see it. """
+
+    color_idx = color_index.get(color)
+    if color_idx is None:
+        color_idx = len(color_index)
+        color_index[color] = color_idx
+
+    return color_idx
+
+def fill_max_per_game(line, color_index, maxima):
+    """ Writes the maximum number of cubes per color of this game into maxima, an array indexed by color that is reused across games.
+    Colors we have not seen before are interned into color_index, and maxima grows by one slot for each of them.
+    """
+
+    for color_idx in range(len(maxima)):
+        maxima[color_idx] = 0
+
+    for number, color in CUBE_PATTERN.findall(line):
+        color_idx = intern_color(color, color_index)
+        if color_idx == len(maxima):
+            maxima.append(0)
+
+        number = int(number)
+        if number > maxima[color_idx]:
+            maxima[color_idx] = number
+
+    return maxima
+
 def get_max_per_game(line):
     """ Returns the maximum number of cubes in this game given a line. """
 
-    all_cube_numbers = {
-        "red": 0,
-        "green": 0,
-        "blue": 0
-    }
-    iterations = line.split(";")
-    for iteration in iterations:
-        cubes = iteration.split(",")
-        for cube in cubes:
-            number, color = cube.strip().split(" ")
-            if color in all_cube_numbers:
-                all_cube_numbers[color] = max(all_cube_numbers[color], int(number))
+    color_index = {color: color_idx for color_idx, color in enumerate(DEFAULT_COLORS)}
+    maxima = fill_max_per_game(line, color_index, array('q', bytes(8 * len(color_index))))
 
-    return all_cube_numbers
+    return {color: maxima[color_idx] for color, color_idx in color_index.items()}
 
 def test_get_max_per_game():
     game = "4 blue, 4 red, 16 green; 14 green, 5 red; 1 blue, 3 red, 5 green"
@@ -41,6 +78,89 @@ def parse_game_id(line):
 
     return int(line.split(":")[0].strip().split(" ")[1])
 
+def parse_games_columnar(data):
+    """ Parses the whole input (as bytes) in a single scan into a column of game ids and one column of max cubes per color.
+    Returns (game_ids, color_index, color_columns), where color_index maps each color to its column in color_columns.
+    A color we see for the first time gets a new column, filled with zeros for the games before it.
+    """
+
+    game_ids = array('q')
+    color_index = {color.encode(): color_idx for color_idx, color in enumerate(DEFAULT_COLORS)}
+    color_columns = [array('q') for _ in color_index]
+
+    # walk the matches one by one, so the list of every token in the file is never built
+    for match in GAME_PATTERN.finditer(data):
+        # a new game starts a new row in every column
+        if match.lastindex == 1:
+            game_ids.append(int(match.group(1)))
+            for column in color_columns:
+                column.append(0)
+            continue
+
+        number, color = match.group(2, 3)
+        color_idx = intern_color(color, color_index)
+        if color_idx == len(color_columns):
+            color_columns.append(array('q', bytes(8 * len(game_ids))))
+
+        column = color_columns[color_idx]
+        number = int(number)
+        if number > column[-1]:
+            column[-1] = number
+
+    return game_ids, {color.decode(): color_idx for color, color_idx in color_index.items()}, color_columns
+
+def sum_game_powers(columns):
+    """ Returns the sum over all games of the product of the max cubes of every color, as a vectorized reduction over the columns. """
+
+    game_ids, _, color_columns = columns
+
+    powers = np.ones(len(game_ids), dtype=np.int64)
+    for column in color_columns:
+        powers *= np.frombuffer(column, dtype=np.int64)
+
+    return int(powers.sum())
+
+def test_columnar():
+    data = b"""Game 1: 3 blue, 4 red; 1 red, 2 green, 6 blue; 2 green
+Game 2: 1 blue, 2 green; 3 green, 4 blue, 1 red; 1 green, 1 blue
+Game 3: 8 green, 6 blue, 20 red; 5 blue, 4 red, 13 green; 5 green, 1 red
+Game 4: 1 green, 3 red, 6 blue; 3 green, 6 red; 3 green, 15 blue, 14 red
+Game 5: 6 red, 1 blue, 3 green; 2 blue, 1 red, 2 green
+"""
+    columns = parse_games_columnar(data)
+
+    assert list(columns[0]) == [1, 2, 3, 4, 5]
+    assert list(columns[2][columns[1]["red"]]) == [4, 1, 20, 14, 6]
+    assert sum_game_powers(columns) == 2286
+
+def test_dynamic_colors():
+    assert get_max_per_game("2 yellow, 3 red; 1 blue, 1 green") == {"red": 3, "green": 1, "blue": 1, "yellow": 2}
+
+    columns = parse_games_columnar(b"Game 1: 1 red, 2 green, 3 blue\nGame 2: 2 yellow, 3 red; 1 blue, 1 green\nGame 3: 5 red, 1 green, 1 blue, 4 yellow\n")
+
+    assert list(columns[2][columns[1]["yellow"]]) == [0, 2, 4]
+    assert sum_game_powers(columns) == 6 + 20
+
+def run_columnar(input_file, benchmark=False):
+    """ Answers the puzzle with the columnar parser, printing the time of each phase if benchmark is set. """
+
+    if np is None:
+        raise ImportError("The --columnar mode requires numpy to be installed")
+
+    start_time = time.perf_counter()
+    with open(input_file, 'rb') as file:
+        columns = parse_games_columnar(file.read())
+    parse_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    result = sum_game_powers(columns)
+    reduce_time = time.perf_counter() - start_time
+
+    if benchmark:
+        print(f"Parsed {len(columns[0])} games in {parse_time:.3f}s, reduced in {reduce_time:.3f}s")
+
+    return result
+
 def main():
     args = parse_arguments()
     max_cubes = {
@@ -49,8 +169,18 @@ def main():
         "blue": 14
     }
 
+    if args.columnar or args.benchmark:
+        possible_games_sum = run_columnar(args.input_file, args.benchmark)
+        print(f"Sum of max possible red*green*blue games: {possible_games_sum}")
+        return
+
     possible_games_sum = 0
 
+    # a single array of maxima per color is reused for every game
+    color_index = {color: color_idx for color_idx, color in enumerate(DEFAULT_COLORS)}
+    get_number_of_cubes = array('q', bytes(8 * len(color_index)))
+    num_colors = len(get_number_of_cubes)
+
     # Use args.input_file to access the path of the input file
     with open(args.input_file, 'r') as file:
         for line in file:
@@ -59,9 +189,14 @@ def main():
             game_id = parse_game_id(line)
 
             line_with_cubes_only = line.split(":")[1].strip()
-            get_number_of_cubes = get_max_per_game(line_with_cubes_only)
+            fill_max_per_game(line_with_cubes_only, color_index, get_number_of_cubes)
+
+            # a new color means every game so far had none of it, so their power drops to 0
+            if len(get_number_of_cubes) > num_colors:
+                num_colors = len(get_number_of_cubes)
+                possible_games_sum = 0
 
-            total_cubes_per_game = get_number_of_cubes["red"] * get_number_of_cubes["green"] * get_number_of_cubes["blue"]
+            total_cubes_per_game = math.prod(get_number_of_cubes)
 
             possible_games_sum += total_cubes_per_game
 
@@ -73,4 +208,9 @@ def main():
     print(f"Sum of max possible red*green*blue games: {possible_games_sum}")
 
 if __name__ == "__main__":
+    test_get_max_per_game()
+    # the columnar mode needs numpy
+    if np is not None:
+        test_columnar()
+        test_dynamic_colors()
     main()
\ No newline at end of file
@@ -1,10 +1,36 @@
 #/usr/bin/env python3
 
+import re
+import math
 import argparse
+from array import array
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NUMBER_PATTERN = re.compile(r"[0-9]+")
+SYMBOL_PATTERN = re.compile(r"[^.0-9]")
+CELL_PATTERN = re.compile(r"[^.]+")
+
+EMPTY_ROW = (array('i'), "")
+
+MAX_INT64_DIGITS = 18 # longest run of digits that always fits in an int64
+
+# the example schematic in the puzzle, shared by the tests
+EXAMPLE_SCHEMATIC = ["467..114..", "...*......", "..35..633.", "......#...", "617*......", ".....+.58.", "..592.....", "......755.", "...$.*....", ".664.598.."]
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Process input file')
     parser.add_argument('--input_file', type=str, help='Path to the input file')
+    parser.add_argument('--numpy', action='store_true', help='Load the schematic as a 2-D array and find the part numbers with vectorized NumPy operations')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes, each handling a band of rows')
+    parser.add_argument('--sparse', action='store_true', help='Keep only the cells that are not "." and check the neighbors with binary search')
+    parser.add_argument('--stream', action='store_true', help='Read the schematic row by row, keeping only three rows in memory')
     return parser.parse_args()
 
 def is_valid_symbol(text):
@@ -27,9 +53,251 @@ def get_matrix_dimensions(file):
 
     return num_rows, num_cols
 
+def iter_row_windows(lines):
+    """ Yields (row_idx, previous_row, row, next_row) for every row of the schematic.
+    The rows go through a ring buffer of three, so we never hold more than three rows in memory.
+    Rows outside of the schematic are empty strings.
+    """
+
+    window = deque(["", ""], maxlen=3)
+    row_idx = -1
+    for line in lines:
+        window.append(line.strip())
+        if row_idx >= 0:
+            yield row_idx, window[0], window[1], window[2]
+        row_idx += 1
+
+    # the last row has no next row
+    window.append("")
+    if row_idx >= 0:
+        yield row_idx, window[0], window[1], window[2]
+
+def get_number_neighbors(prev_line, line, next_line, start, end):
+    """ Returns all the characters around the number that spans [start, end) of the line. """
+
+    left = max(start - 1, 0)
+
+    return prev_line[left:end+1] + line[left:start] + line[end:end+1] + next_line[left:end+1]
+
+def iter_part_numbers(lines):
+    """ Yields (row_idx, start, number) for every number with a symbol around it, as the rows go by. """
+
+    for row_idx, prev_line, line, next_line in iter_row_windows(lines):
+        for match in NUMBER_PATTERN.finditer(line):
+            if SYMBOL_PATTERN.search(get_number_neighbors(prev_line, line, next_line, match.start(), match.end())):
+                yield row_idx, match.start(), int(match.group())
+
+def test_stream():
+    lines = EXAMPLE_SCHEMATIC
+
+    assert sum(number for _, _, number in iter_part_numbers(lines)) == 4361
+    assert list(iter_part_numbers(["1*2"])) == [(0, 0, 1), (0, 2, 2)]
+    assert list(iter_part_numbers([])) == []
+
+def schematic_to_array(lines):
+    """ Returns the schematic as a 2-D uint8 array, given its rows as bytes. Shorter rows are padded with ".". """
+
+    lines = [line.strip() for line in lines]
+    if lines and lines[-1] == b"":
+        lines.pop()
+
+    num_rows = len(lines)
+    num_cols = max((len(line) for line in lines), default=0)
+
+    return np.frombuffer(b"".join(line.ljust(num_cols, b".") for line in lines), dtype=np.uint8).reshape(num_rows, num_cols)
+
+def sum_part_numbers_array(schematic):
+    """ Returns the sum of the part numbers of a schematic given as a 2-D uint8 array.
+    We build a mask of the symbols and dilate it by one cell in every direction (a 3x3 neighborhood),
+    then label the runs of digits - any run that touches the dilated mask is a part number.
+    Numbers of up to MAX_INT64_DIGITS digits are computed in int64, the few longer ones are read as Python ints, so the sum is exact.
+    """
+
+    num_rows, num_cols = schematic.shape
+
+    is_digit = (schematic >= ord("0")) & (schematic <= ord("9"))
+    is_symbol = ~is_digit & (schematic != ord("."))
+
+    padded_symbols = np.pad(is_symbol, 1)
+    near_symbol = np.zeros_like(is_symbol)
+    for row_offset in range(3):
+        for col_offset in range(3):
+            near_symbol |= padded_symbols[row_offset:row_offset+num_rows, col_offset:col_offset+num_cols]
+
+    # flatten the rows with an extra non-digit column, so a run of digits never continues on the next row
+    digit_positions = np.flatnonzero(np.pad(is_digit, ((0, 0), (0, 1))))
+    if digit_positions.size == 0:
+        return 0
+
+    is_run_start = np.concatenate(([True], np.diff(digit_positions) != 1))
+    run_starts = np.flatnonzero(is_run_start)
+    run_ends = np.concatenate((run_starts[1:], [digit_positions.size])) - 1
+    run_labels = np.cumsum(is_run_start) - 1
+
+    # runs too long for an int64 are left out of the vectorized sum
+    padded_schematic = np.pad(schematic, ((0, 0), (0, 1))).ravel()
+    is_long_run = run_ends - run_starts + 1 > MAX_INT64_DIGITS
+
+    # every digit is worth digit * 10^(number of digits after it in its run)
+    digits = padded_schematic[digit_positions].astype(np.int64) - ord("0")
+    exponents = run_ends[run_labels] - np.arange(digit_positions.size)
+    place_values = np.where(is_long_run[run_labels], 0, np.power(10, np.minimum(exponents, MAX_INT64_DIGITS - 1), dtype=np.int64))
+    numbers = np.add.reduceat(digits * place_values, run_starts)
+
+    is_part_number = np.logical_or.reduceat(np.pad(near_symbol, ((0, 0), (0, 1))).ravel()[digit_positions], run_starts)
+
+    # split the numbers into 9 digit halves, so neither sum can overflow
+    part_numbers = numbers[is_part_number & ~is_long_run]
+    total_sum = int((part_numbers // 10**9).sum()) * 10**9 + int((part_numbers % 10**9).sum())
+
+    for run_idx in np.flatnonzero(is_part_number & is_long_run):
+        total_sum += int(padded_schematic[digit_positions[run_starts[run_idx]]:digit_positions[run_ends[run_idx]] + 1].tobytes())
+
+    return total_sum
+
+def test_numpy():
+    lines = [line.encode() for line in EXAMPLE_SCHEMATIC] + [b""]
+
+    assert sum_part_numbers_array(schematic_to_array(lines)) == 4361
+    assert sum_part_numbers_array(schematic_to_array([b"12", b"3*", b"45."])) == 60
+    assert sum_part_numbers_array(schematic_to_array([b"12.", b"..."])) == 0
+
+    # past the digits of an int64, and sums past its range
+    assert sum_part_numbers_array(schematic_to_array([b"12345678901234567890*"])) == 12345678901234567890
+    assert sum_part_numbers_array(schematic_to_array([b"999999999999999999*999999999999999999", b"*999999999999999999"])) == 3 * 999999999999999999
+
+def load_sparse_schematic(lines):
+    """ Returns the schematic as one (columns, characters) pair per row, holding only the cells that are not ".".
+    The columns of each row are sorted, and characters[i] is the character at columns[i].
+    """
+
+    rows = []
+    for line in lines:
+        columns = array('i')
+        characters = []
+        for match in CELL_PATTERN.finditer(line.strip()):
+            columns.extend(range(match.start(), match.end()))
+            characters.append(match.group())
+
+        rows.append((columns, "".join(characters)) if columns else EMPTY_ROW)
+
+    return rows
+
+def has_symbol_between(row, start, end):
+    """ Returns True if the sparse row has a symbol in the columns [start, end], finding the first candidate with binary search. """
+
+    columns, characters = row
+
+    cell_idx = bisect_left(columns, start)
+    while cell_idx < len(columns) and columns[cell_idx] <= end:
+        if not characters[cell_idx].isdigit():
+            return True
+        cell_idx += 1
+
+    return False
+
+def iter_sparse_part_numbers(rows):
+    """ Yields (row_idx, start, number) for every part number of a sparse schematic.
+    The work depends on the number of cells that are not ".", not on the area of the schematic.
+    """
+
+    for row_idx, (columns, characters) in enumerate(rows):
+        prev_row = rows[row_idx - 1] if row_idx > 0 else EMPTY_ROW
+        next_row = rows[row_idx + 1] if row_idx < len(rows) - 1 else EMPTY_ROW
+
+        cell_idx = 0
+        while cell_idx < len(columns):
+            if not characters[cell_idx].isdigit():
+                cell_idx += 1
+                continue
+
+            # a number is a run of digits in consecutive columns
+            first_cell_idx = cell_idx
+            while cell_idx < len(columns) - 1 and columns[cell_idx + 1] == columns[cell_idx] + 1 and characters[cell_idx + 1].isdigit():
+                cell_idx += 1
+            start = columns[first_cell_idx]
+            end = columns[cell_idx]
+
+            # a cell right before or after the number on its own row can only be a symbol
+            is_part_number = (first_cell_idx > 0 and columns[first_cell_idx - 1] == start - 1) or (cell_idx < len(columns) - 1 and columns[cell_idx + 1] == end + 1)
+
+            if is_part_number or has_symbol_between(prev_row, start - 1, end + 1) or has_symbol_between(next_row, start - 1, end + 1):
+                yield row_idx, start, int(characters[first_cell_idx:cell_idx+1])
+
+            cell_idx += 1
+
+def test_sparse():
+    lines = EXAMPLE_SCHEMATIC
+
+    assert list(iter_sparse_part_numbers(load_sparse_schematic(lines))) == list(iter_part_numbers(lines))
+    assert sum(number for _, _, number in iter_sparse_part_numbers(load_sparse_schematic(["12#3", "....", "4...", ".$.."]))) == 19
+
+def process_band(band_lines, first_row_idx, band_start, band_end):
+    """ Returns the sum of the part numbers on the rows [band_start, band_end).
+    band_lines holds those rows plus one halo row above and below (where they exist), starting at row first_row_idx.
+    The halo rows are only there for the symbols - their numbers belong to the neighboring bands, so we skip them.
+    """
+
+    total_sum = 0
+    for row_idx, _, number in iter_part_numbers(band_lines):
+        if band_start <= row_idx + first_row_idx < band_end:
+            total_sum += number
+
+    return total_sum
+
+def iter_bands(lines, num_bands):
+    """ Yields (band_lines, first_row_idx, band_start, band_end) for num_bands horizontal bands of the schematic, each with its halo rows. """
+
+    band_size = max(math.ceil(len(lines) / num_bands), 1)
+    for band_start in range(0, len(lines), band_size):
+        band_end = min(band_start + band_size, len(lines))
+        first_row_idx = max(band_start - 1, 0)
+        yield lines[first_row_idx:band_end+1], first_row_idx, band_start, band_end
+
+def process_parallel(lines, workers):
+    """ Returns the sum of the part numbers, splitting the schematic into bands that a pool of worker processes handles. """
+
+    # a few bands per worker, so a slow band does not keep the other workers idle
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(process_band, *band) for band in iter_bands(lines, workers * 4)]
+        return sum(future.result() for future in futures)
+
+def test_bands():
+    lines = EXAMPLE_SCHEMATIC
+
+    for num_bands in range(1, len(lines) + 2):
+        assert sum(process_band(*band) for band in iter_bands(lines, num_bands)) == 4361
+
 def main():
     args = parse_arguments()
 
+    if args.numpy:
+        if np is None:
+            raise ImportError("The --numpy mode requires numpy to be installed")
+
+        with open(args.input_file, 'rb') as file:
+            total_sum = sum_part_numbers_array(schematic_to_array(file.read().split(b"\n")))
+        print(f"Total sum: {total_sum}")
+        return
+
+    if args.workers > 1:
+        with open(args.input_file, 'r') as file:
+            total_sum = process_parallel([line.strip() for line in file], args.workers)
+        print(f"Total sum: {total_sum}")
+        return
+
+    if args.sparse:
+        with open(args.input_file, 'r') as file:
+            total_sum = sum(number for _, _, number in iter_sparse_part_numbers(load_sparse_schematic(file)))
+        print(f"Total sum: {total_sum}")
+        return
+
+    if args.stream:
+        with open(args.input_file, 'r') as file:
+            total_sum = sum(number for _, _, number in iter_part_numbers(file))
+        print(f"Total sum: {total_sum}")
+        return
+
     total_sum = 0
 
     # Use args.input_file to access the path of the input file
@@ -117,4 +385,9 @@ def main():
 
 
 if __name__ == '__main__':
+    test_stream()
+    test_bands()
+    test_sparse()
+    if np is not None:
+        test_numpy()
     main()
\ No newline at end of file
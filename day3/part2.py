@@ -1,10 +1,23 @@
 #/usr/bin/env python3
 
+import re
+import math
 import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+NUMBER_PATTERN = re.compile(r"[0-9]+")
+SYMBOL_PATTERN = re.compile(r"[^.0-9]")
+
+# the example schematic in the puzzle, shared by the tests
+EXAMPLE_SCHEMATIC = ["467..114..", "...*......", "..35..633.", "......#...", "617*......", ".....+.58.", "..592.....", "......755.", "...$.*....", ".664.598.."]
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Process input file')
     parser.add_argument('--input_file', type=str, help='Path to the input file')
+    parser.add_argument('--gear_report', action='store_true', help='Print every gear symbol with the numbers around it')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes, each handling a band of rows')
+    parser.add_argument('--stream', action='store_true', help='Read the schematic row by row, keeping only three rows in memory')
     return parser.parse_args()
 
 def is_valid_symbol(text):
@@ -27,11 +40,237 @@ def get_matrix_dimensions(file):
 
     return num_rows, num_cols
 
+def iter_row_windows(lines):
+    """ Yields (row_idx, previous_row, row, next_row) for every row of the schematic.
+    The rows go through a ring buffer of three, so we never hold more than three rows in memory.
+    Rows outside of the schematic are empty strings.
+    """
+
+    window = deque(["", ""], maxlen=3)
+    row_idx = -1
+    for line in lines:
+        window.append(line.strip())
+        if row_idx >= 0:
+            yield row_idx, window[0], window[1], window[2]
+        row_idx += 1
+
+    # the last row has no next row
+    window.append("")
+    if row_idx >= 0:
+        yield row_idx, window[0], window[1], window[2]
+
+def get_number_neighbors(prev_line, line, next_line, start, end):
+    """ Returns all the characters around the number that spans [start, end) of the line. """
+
+    left = max(start - 1, 0)
+
+    return prev_line[left:end+1] + line[left:start] + line[end:end+1] + next_line[left:end+1]
+
+def get_adjacent_gears(prev_line, line, next_line, row_idx, start, end):
+    """ Returns the (r, c) positions of all the gear symbols ("*") around the number that spans [start, end) of the line. """
+
+    left = max(start - 1, 0)
+
+    gears = []
+    for neighbor_row_idx, neighbor_line, neighbor_start, neighbor_end in [(row_idx - 1, prev_line, left, end + 1), (row_idx, line, left, start), (row_idx, line, end, end + 1), (row_idx + 1, next_line, left, end + 1)]:
+        gear_col = neighbor_line.find("*", neighbor_start, neighbor_end)
+        while gear_col != -1:
+            gears.append((neighbor_row_idx, gear_col))
+            gear_col = neighbor_line.find("*", gear_col + 1, neighbor_end)
+
+    return gears
+
+def iter_part_numbers(lines):
+    """ Yields (row_idx, start, number, gears) for every number with a symbol around it, as the rows go by.
+    gears holds the positions of every gear candidate around the number.
+    """
+
+    for row_idx, prev_line, line, next_line in iter_row_windows(lines):
+        for match in NUMBER_PATTERN.finditer(line):
+            start, end = match.span()
+            if SYMBOL_PATTERN.search(get_number_neighbors(prev_line, line, next_line, start, end)):
+                yield row_idx, start, int(match.group()), get_adjacent_gears(prev_line, line, next_line, row_idx, start, end)
+
+def iter_gears(part_numbers):
+    """ Yields (gear, numbers) for every gear candidate, as soon as no more numbers can reach it.
+    A gear on row r only touches numbers of rows r-1 to r+1, so once we see a number past row r+1, the gear is complete.
+    """
+
+    pending_gears = {}
+    last_row_idx = None
+    for row_idx, _, number, gears in part_numbers:
+        if row_idx != last_row_idx:
+            for gear in [gear for gear in pending_gears if gear[0] < row_idx - 1]:
+                yield gear, pending_gears.pop(gear)
+            last_row_idx = row_idx
+
+        for gear in gears:
+            pending_gears.setdefault(gear, []).append(number)
+
+    yield from pending_gears.items()
+
+def stream_schematic(lines):
+    """ Returns the sum of the part numbers and the sum of the gear ratios, reading the schematic one row at a time. """
+
+    total_sum = 0
+
+    def count_parts():
+        nonlocal total_sum
+        for part_number in iter_part_numbers(lines):
+            total_sum += part_number[2]
+            yield part_number
+
+    missing_gear = 0
+    for _, numbers in iter_gears(count_parts()):
+        if len(numbers) == 2:
+            missing_gear += numbers[0] * numbers[1]
+
+    return total_sum, missing_gear
+
+def index_gears(lines):
+    """ Returns a dictionary with an empty list of numbers for the position (r, c) of every gear symbol ("*"). """
+
+    gears = {}
+    for row_idx, line in enumerate(lines):
+        gear_col = line.find("*")
+        while gear_col != -1:
+            gears[(row_idx, gear_col)] = []
+            gear_col = line.find("*", gear_col + 1)
+
+    return gears
+
+def assign_numbers_to_gears(lines, gears):
+    """ Adds every number to the list of each gear around it, looking its neighboring cells up in the gear index.
+    This costs a constant number of lookups per digit, so the whole pass is O(number of digits + number of symbols).
+    """
+
+    for row_idx, line in enumerate(lines):
+        for match in NUMBER_PATTERN.finditer(line):
+            start, end = match.span()
+            number = int(match.group())
+
+            for neighbor_row_idx in (row_idx - 1, row_idx, row_idx + 1):
+                for neighbor_col in range(start - 1, end + 1):
+                    gear_numbers = gears.get((neighbor_row_idx, neighbor_col))
+                    if gear_numbers is not None:
+                        gear_numbers.append(number)
+
+    return gears
+
+def sum_gear_ratios(gears):
+    """ Returns the sum of the gear ratios - the product of the two numbers of every gear that touches exactly two numbers. """
+
+    missing_gear = 0
+    for gear, numbers in gears.items():
+        if len(numbers) == 2:
+            missing_gear += numbers[0] * numbers[1]
+
+    return missing_gear
+
+def print_gear_report(gears):
+    """ Prints every gear symbol with the numbers around it and its ratio, if it has one. """
+
+    for (row_idx, col_idx), numbers in sorted(gears.items()):
+        ratio = numbers[0] * numbers[1] if len(numbers) == 2 else None
+        print(f"Gear ({row_idx}, {col_idx}): numbers {numbers}, ratio {ratio}")
+
+def test_gear_index():
+    lines = EXAMPLE_SCHEMATIC
+
+    gears = assign_numbers_to_gears(lines, index_gears(lines))
+    assert gears == {(1, 3): [467, 35], (4, 3): [617], (8, 5): [755, 598]}
+    assert sum_gear_ratios(gears) == 467835
+
+    # a number next to another symbol still counts for its gears
+    gears = assign_numbers_to_gears(["2#..", "*...", "3..."], index_gears(["2#..", "*...", "3..."]))
+    assert sum_gear_ratios(gears) == 6
+
+def test_stream():
+    lines = EXAMPLE_SCHEMATIC
+
+    assert stream_schematic(lines) == (4361, 467835)
+    assert stream_schematic(["1*2"]) == (3, 2)
+    assert stream_schematic(["2..", "*..", "3.."]) == (5, 6)
+    assert stream_schematic([]) == (0, 0)
+
+def process_band(band_lines, first_row_idx, band_start, band_end):
+    """ Returns the sum of the part numbers on the rows [band_start, band_end) and the numbers of every gear around them.
+    band_lines holds those rows plus one halo row above and below (where they exist), starting at row first_row_idx.
+    The halo rows are only there for the symbols - their numbers belong to the neighboring bands, so we skip them.
+    A gear on a band edge gets numbers from both bands, which we merge afterwards.
+    """
+
+    total_sum = 0
+    gears = {}
+    for row_idx, _, number, number_gears in iter_part_numbers(band_lines):
+        if not band_start <= row_idx + first_row_idx < band_end:
+            continue
+
+        total_sum += number
+        for gear_row_idx, gear_col_idx in number_gears:
+            gears.setdefault((gear_row_idx + first_row_idx, gear_col_idx), []).append(number)
+
+    return total_sum, gears
+
+def iter_bands(lines, num_bands):
+    """ Yields (band_lines, first_row_idx, band_start, band_end) for num_bands horizontal bands of the schematic, each with its halo rows. """
+
+    band_size = max(math.ceil(len(lines) / num_bands), 1)
+    for band_start in range(0, len(lines), band_size):
+        band_end = min(band_start + band_size, len(lines))
+        first_row_idx = max(band_start - 1, 0)
+        yield lines[first_row_idx:band_end+1], first_row_idx, band_start, band_end
+
+def merge_bands(band_results):
+    """ Adds up the part sums of the bands and merges their gear maps. """
+
+    total_sum = 0
+    all_gears_found = {}
+    for band_sum, band_gears in band_results:
+        total_sum += band_sum
+        for gear, numbers in band_gears.items():
+            all_gears_found.setdefault(gear, []).extend(numbers)
+
+    return total_sum, all_gears_found
+
+def process_parallel(lines, workers):
+    """ Returns the sum of the part numbers and the gear map, splitting the schematic into bands that a pool of worker processes handles. """
+
+    # a few bands per worker, so a slow band does not keep the other workers idle
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(process_band, *band) for band in iter_bands(lines, workers * 4)]
+        return merge_bands(future.result() for future in futures)
+
+def test_bands():
+    lines = EXAMPLE_SCHEMATIC
+
+    for num_bands in range(1, len(lines) + 2):
+        total_sum, all_gears_found = merge_bands(process_band(*band) for band in iter_bands(lines, num_bands))
+        assert total_sum == 4361
+        assert sum_gear_ratios(all_gears_found) == 467835
+
 def main():
     args = parse_arguments()
 
+    if args.workers > 1:
+        with open(args.input_file, 'r') as file:
+            total_sum, all_gears_found = process_parallel([line.strip() for line in file], args.workers)
+        print(f"Total sum: {total_sum}")
+
+        if args.gear_report:
+            print_gear_report(all_gears_found)
+
+        print(f"Missing gear: {sum_gear_ratios(all_gears_found)}")
+        return
+
+    if args.stream:
+        with open(args.input_file, 'r') as file:
+            total_sum, missing_gear = stream_schematic(file)
+        print(f"Total sum: {total_sum}")
+        print(f"Missing gear: {missing_gear}")
+        return
+
     total_sum = 0
-    all_gears_found = {}
 
     # Use args.input_file to access the path of the input file
     with open(args.input_file, 'r') as file:
@@ -65,29 +304,23 @@ def main():
             # if the current character is not a digit, but we have a number already drawn
             if digit_start is not None and digit_end is not None:
                 symbols_to_check = []
-                ids_to_check = [] # (r,c) for each symbol
 
                 # record the symbols in the previous line
                 if prev_line is not None:
                     for number_idx in range(digit_start, digit_end + 1):
                         if number_idx != 0:
                             symbols_to_check.append(prev_line[number_idx-1]) # top left
-                            ids_to_check.append((row_idx-1, number_idx-1))
 
                         symbols_to_check.append(prev_line[number_idx])       # top
-                        ids_to_check.append((row_idx-1, number_idx))
 
                         if number_idx != num_cols - 1:
                             symbols_to_check.append(prev_line[number_idx+1]) # top right
-                            ids_to_check.append((row_idx-1, number_idx+1))
                 
                 # record the symbols in the current line
                 if digit_start != 0:
                     symbols_to_check.append(line[digit_start-1]) # left
-                    ids_to_check.append((row_idx, digit_start-1))
                 if digit_end != num_cols - 1:
                     symbols_to_check.append(line[digit_end+1])   # right
-                    ids_to_check.append((row_idx, digit_end+1))
 
                 # record the symbols in the next line 
                 if row_idx < num_rows - 1:
@@ -97,23 +330,15 @@ def main():
                     for number_idx in range(digit_start, digit_end + 1):
                         if number_idx != 0:
                             symbols_to_check.append(next_line[number_idx-1]) # bottom left
-                            ids_to_check.append((row_idx+1, number_idx-1))
 
                         symbols_to_check.append(next_line[number_idx])       # bottom
-                        ids_to_check.append((row_idx+1, number_idx))
 
                         if number_idx != num_cols - 1:
                             symbols_to_check.append(next_line[number_idx+1]) # bottom right
-                            ids_to_check.append((row_idx+1, number_idx+1))
 
                 # check for the actual symbol
-                for symbol_idx, symbol in enumerate(symbols_to_check):
+                for symbol in symbols_to_check:
                     if is_valid_symbol(symbol):
-                        if symbol == "*":
-                            if ids_to_check[symbol_idx] not in all_gears_found:
-                                all_gears_found[ids_to_check[symbol_idx]] = [int(number)]
-                            else:
-                                all_gears_found[ids_to_check[symbol_idx]].append(int(number))
                         total_sum += int(number)
                         number_added = True
                         break
@@ -130,12 +355,17 @@ def main():
 
     print(f"Total sum: {total_sum}")
 
-    missing_gear = 0
-    for gear, numbers in all_gears_found.items():
-        if len(numbers) == 2:
-            missing_gear += numbers[0] * numbers[1]
+    # the gears are collected around each symbol, so a number that touches several gears counts for all of them
+    lines = [line.strip() for line in lines]
+    all_gears_found = assign_numbers_to_gears(lines, index_gears(lines))
+
+    if args.gear_report:
+        print_gear_report(all_gears_found)
 
-    print(f"Missing gear: {missing_gear}")
+    print(f"Missing gear: {sum_gear_ratios(all_gears_found)}")
 
 if __name__ == '__main__':
+    test_stream()
+    test_bands()
+    test_gear_index()
     main()
\ No newline at end of file
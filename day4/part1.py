@@ -1,6 +1,7 @@
 """ Description: Day 4: Scratch cards
-The idea is to store the winning numbers (as they are fewer) in a dictionary, and then check the numbers in the input file against the dictionary. 
-If the number is in the dictionary, then it is a winning number. Otherwise, it is not.
+The numbers on the cards are small, so we store each side of a card as a bitmask, where bit n is set if the number n is on that side.
+Our winning numbers are then the bits set in both masks (win & ours), and the number of matches is the count of those bits.
+For large decks, the same is done with a boolean matrix per side (a row per card), counting the matches of all cards at once.
 We then calculate the points of a card by computing the amount of winning numbers on the card and applying the formula:
 
 floor [2 ^ (number of winning numbers - 1)]
@@ -8,36 +9,163 @@ floor [2 ^ (number of winning numbers - 1)]
 The above formula takes care of the case where the number of winning numbers is 0, in which case the formula returns 0 points.
 """
 
+import sys
 import math
 import argparse
+from contextlib import nullcontext
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Process input file')
-    parser.add_argument('--input_file', type=str, help='Path to the input file')
+    parser.add_argument('--input_file', type=str, help='Path to the input file, or "-" (the default) to read from stdin')
+    parser.add_argument('--progress', type=int, default=0, help='Print the running total to stderr every N cards')
+    parser.add_argument('--vectorized', action='store_true', help='Count the matches of the whole deck at once with NumPy')
     return parser.parse_args()
 
+def open_input(input_file):
+    """ Opens the input file for reading, or returns stdin (without closing it afterwards) if the input file is "-" or not given.
+    We only ever read the input once from start to end, so pipes and other streams work too.
+    """
+
+    if input_file is None or input_file == "-":
+        return nullcontext(sys.stdin)
+
+    return open(input_file, 'r')
+
+def get_number_mask(numbers):
+    """ Returns the numbers (separated by spaces) as an integer bitmask, where bit n is set for the number n. """
+
+    mask = 0
+    for number in numbers.split():
+        mask |= 1 << int(number)
+
+    return mask
+
+def get_card_matches(line):
+    """ Returns the number of our numbers that are winning numbers on this card.
+    Both sides are encoded as bitmasks, so the matches are the set bits of their intersection.
+    """
+
+    all_numbers = line.split(":")[1].split("|")
+
+    return (get_number_mask(all_numbers[0]) & get_number_mask(all_numbers[1])).bit_count()
+
+def get_cards_matrices(lines):
+    """ Returns the winning numbers and our numbers of all cards as two boolean matrices, with a row per card and a column per number. """
+
+    winning_numbers = []
+    our_numbers = []
+    for line in lines:
+        if line.strip() == "":
+            continue
+
+        all_numbers = line.split(":")[1].split("|")
+        winning_numbers.append([int(n) for n in all_numbers[0].split()])
+        our_numbers.append([int(n) for n in all_numbers[1].split()])
+
+    num_cols = 1 + max((max(numbers, default=0) for numbers in winning_numbers + our_numbers), default=0)
+
+    matrices = []
+    for card_numbers in (winning_numbers, our_numbers):
+        matrix = np.zeros((len(card_numbers), num_cols), dtype=bool)
+        rows = np.repeat(np.arange(len(card_numbers)), [len(numbers) for numbers in card_numbers])
+        matrix[rows, np.fromiter(chain.from_iterable(card_numbers), dtype=np.int64)] = True
+        matrices.append(matrix)
+
+    return matrices
+
+def get_all_card_matches(lines):
+    """ Returns the number of matches of every card, computed for the whole deck in one vectorized operation. """
+
+    if np is None:
+        raise ImportError("The --vectorized mode requires numpy to be installed")
+
+    winning_matrix, our_matrix = get_cards_matrices(lines)
+
+    return np.count_nonzero(winning_matrix & our_matrix, axis=1)
+
+def sum_card_points(card_matches):
+    """ Returns the points of all cards given their matches, 2 ^ (matches - 1) for every card with at least one match.
+    A card can have more matches than an int64 has bits, so we only count the cards per number of matches with NumPy,
+    and add up the points of each number of matches as Python ints.
+    """
+
+    cards_per_matches = np.bincount(np.asarray(card_matches, dtype=np.int64))
+
+    return sum(num_cards << (matches - 1) for matches, num_cards in enumerate(cards_per_matches.tolist()) if matches > 0)
+
+def get_total_points(card_matches, progress=0):
+    """ Returns the points of all cards given their matches, printing the running total to stderr every progress cards if it is set. """
+
+    if not progress:
+        return sum_card_points(card_matches)
+
+    total_points = 0
+    for start in range(0, len(card_matches), progress):
+        block = card_matches[start:start + progress]
+        total_points += sum_card_points(block)
+
+        num_cards = start + len(block)
+        if num_cards % progress == 0:
+            print(f"Cards processed: {num_cards}, points so far: {total_points}", file=sys.stderr, flush=True)
+
+    return total_points
+
+def test_card_matches():
+    lines = [
+        "Card 1: 41 48 83 86 17 | 83 86  6 31 17  9 48 53",
+        "Card 2: 13 32 20 16 61 | 61 30 68 82 17 32 24 19",
+        "Card 3:  1 21 53 59 44 | 69 82 63 72 16 21 14  1",
+        "Card 4: 41 92 73 84 69 | 59 84 76 51 58  5 54 83",
+        "Card 5: 87 83 26 28 32 | 88 30 70 12 93 22 82 36",
+        "Card 6: 31 18 13 56 72 | 74 77 10 23 35 67 36 11"
+    ]
+
+    assert [get_card_matches(line) for line in lines] == [4, 2, 2, 1, 0, 0]
+
+    if np is not None:
+        assert list(get_all_card_matches(lines)) == [4, 2, 2, 1, 0, 0]
+        assert get_total_points(get_all_card_matches(lines)) == 13
+
+        # more matches than an int64 has bits
+        card = "Card 1: " + " ".join(str(n) for n in range(70)) + " | " + " ".join(str(n) for n in range(70))
+        assert get_card_matches(card) == 70
+        assert get_total_points(get_all_card_matches([card, card] + lines)) == 2 * 2**69 + 13
+
 def main():
     args = parse_arguments()
     total_points = 0
 
+    if args.vectorized:
+        with open_input(args.input_file) as file:
+            total_points = get_total_points(get_all_card_matches(file.readlines()), args.progress)
+        print(f"Total points from all cards: {total_points}")
+        return
+
     # Use args.input_file to access the path of the input file
-    with open(args.input_file, 'r') as file:
+    with open_input(args.input_file) as file:
+        num_cards = 0
         for line in file:
-            line = line.split(":")[1].strip()
-            all_numbers = line.split("|")
-            winning_numbers = set([int(n) for n in all_numbers[0].strip().split(" ") if n.strip() != ""]) # replace spaces where we have single digit numbers
-            our_numbers = [int(n) for n in all_numbers[1].strip().split(" ") if n.strip() != ""] # replace spaces where we have single digit numbers
+            if line.strip() == "":
+                continue
 
-            total_matches = 0
-            for number in our_numbers:
-                if number in winning_numbers:
-                    total_matches +=1
+            total_matches = get_card_matches(line)
 
             card_points = math.floor(2 ** (total_matches - 1))
 
             total_points += card_points
 
+            num_cards += 1
+            if args.progress and num_cards % args.progress == 0:
+                print(f"Cards processed: {num_cards}, points so far: {total_points}", file=sys.stderr, flush=True)
+
     print(f"Total points from all cards: {total_points}")
 
 if __name__ == "__main__":
+    test_card_matches()
     main()
\ No newline at end of file
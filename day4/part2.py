@@ -1,56 +1,156 @@
 """ Description: Day 4: Scratch cards, Part 2
-The idea is to store the winning numbers (as they are fewer) in a dictionary, and then check the numbers in the input file against the dictionary. 
-If the number is in the dictionary, then it is a winning number. Otherwise, it is not.
-We create a dictionary where the keys are the cards the values are the number of instances.
+The numbers on the cards are small, so we store each side of a card as a bitmask, where bit n is set if the number n is on that side.
+Our winning numbers are then the bits set in both masks (win & ours), and the number of matches is the count of those bits.
+For large decks, the same is done with a boolean matrix per side (a row per card), counting the matches of all cards at once.
 Crucially, we need to multiply the values by the number of instances of the card that we are processing, since we need to account for the fact that we can have multiple instances of the same card.
+A card with N matches adds its instances to each of the next N cards, so instead of updating N cards we keep a difference array:
+we add the instances where the range starts (the next card) and subtract them where it ends, and a running sum over it gives the extra instances of every card.
+The difference array only needs to reach as far as the largest number of matches, so we keep it in a deque and read the file once.
 We then sum the number of instances to get the total number of scratch cards.
 """
 
+import sys
 import math
 import argparse
+from contextlib import nullcontext
+from itertools import chain
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Process input file')
-    parser.add_argument('--input_file', type=str, help='Path to the input file')
+    parser.add_argument('--input_file', type=str, help='Path to the input file, or "-" (the default) to read from stdin')
+    parser.add_argument('--progress', type=int, default=0, help='Print the running total to stderr every N cards')
+    parser.add_argument('--vectorized', action='store_true', help='Count the matches of the whole deck at once with NumPy')
     return parser.parse_args()
 
-def get_number_of_cards(input_file):
-    """ Returns the number of lines in the file as how many cards there are """
+def open_input(input_file):
+    """ Opens the input file for reading, or returns stdin (without closing it afterwards) if the input file is "-" or not given.
+    We only ever read the input once from start to end, so pipes and other streams work too.
+    """
 
-    with open(input_file, 'r') as file:
-        return len(file.readlines())
+    if input_file is None or input_file == "-":
+        return nullcontext(sys.stdin)
 
-def main():
-    args = parse_arguments()
+    return open(input_file, 'r')
+
+def get_number_mask(numbers):
+    """ Returns the numbers (separated by spaces) as an integer bitmask, where bit n is set for the number n. """
+
+    mask = 0
+    for number in numbers.split():
+        mask |= 1 << int(number)
+
+    return mask
+
+def get_card_matches(line):
+    """ Returns the number of our numbers that are winning numbers on this card.
+    Both sides are encoded as bitmasks, so the matches are the set bits of their intersection.
+    """
+
+    all_numbers = line.split(":")[1].split("|")
+
+    return (get_number_mask(all_numbers[0]) & get_number_mask(all_numbers[1])).bit_count()
+
+def get_cards_matrices(lines):
+    """ Returns the winning numbers and our numbers of all cards as two boolean matrices, with a row per card and a column per number. """
+
+    winning_numbers = []
+    our_numbers = []
+    for line in lines:
+        if line.strip() == "":
+            continue
+
+        all_numbers = line.split(":")[1].split("|")
+        winning_numbers.append([int(n) for n in all_numbers[0].split()])
+        our_numbers.append([int(n) for n in all_numbers[1].split()])
+
+    num_cols = 1 + max((max(numbers, default=0) for numbers in winning_numbers + our_numbers), default=0)
+
+    matrices = []
+    for card_numbers in (winning_numbers, our_numbers):
+        matrix = np.zeros((len(card_numbers), num_cols), dtype=bool)
+        rows = np.repeat(np.arange(len(card_numbers)), [len(numbers) for numbers in card_numbers])
+        matrix[rows, np.fromiter(chain.from_iterable(card_numbers), dtype=np.int64)] = True
+        matrices.append(matrix)
+
+    return matrices
+
+def get_all_card_matches(lines):
+    """ Returns the number of matches of every card, computed for the whole deck in one vectorized operation. """
 
-    num_cards = get_number_of_cards(args.input_file)
-    card_instances = {}
-    for i in range(1, num_cards+1):
-        card_instances[i] = 1 # as we process each one of them at least one
-
-    # At this point, we need to count how many instances we have in each card
-    with open(args.input_file, 'r') as file:
-        for line in file:
-            card_idx, line = line.strip().split(":")
-            card_idx = int(card_idx.split()[1].strip())
-            line = line.strip()
-            all_numbers = line.split("|")
-            winning_numbers = set([int(n) for n in all_numbers[0].strip().split(" ") if n.strip() != ""]) # replace spaces where we have single digit numbers
-            our_numbers = [int(n) for n in all_numbers[1].strip().split(" ") if n.strip() != ""] # replace spaces where we have single digit numbers
-
-            total_matches = 0
-            for number in our_numbers:
-                if number in winning_numbers:
-                    total_matches +=1
-
-            for next_card_idx in range(1, total_matches+1):
-                card_instances[card_idx+next_card_idx] += (1 * card_instances[card_idx])
+    if np is None:
+        raise ImportError("The --vectorized mode requires numpy to be installed")
+
+    winning_matrix, our_matrix = get_cards_matrices(lines)
+
+    return np.count_nonzero(winning_matrix & our_matrix, axis=1)
+
+def count_scratch_cards(card_matches, progress=0):
+    """ Returns the total number of scratch cards, given the number of matches of every card in order.
+    Each card costs O(1): difference[i] holds the change of the extra instances from the card i+1 positions ahead to the one before it.
+    If progress is set, the running total is printed to stderr every progress cards.
+    """
 
     total_scratch_cards = 0
-    for card_idx, num_instances in card_instances.items():
+    extra_instances = 0 # copies won from the cards before, kept as a running sum over the differences
+    difference = deque()
+    num_cards = 0
+
+    for total_matches in card_matches:
+        if difference:
+            extra_instances += difference.popleft()
+        num_instances = 1 + extra_instances # as we process each one of them at least one
         total_scratch_cards += num_instances
+        num_cards += 1
+
+        # every instance of this card wins one copy of each of the next total_matches cards
+        if total_matches > 0:
+            while len(difference) <= total_matches:
+                difference.append(0)
+            difference[0] += num_instances
+            difference[total_matches] -= num_instances
+
+        if progress and num_cards % progress == 0:
+            print(f"Cards processed: {num_cards}, scratch cards so far: {total_scratch_cards}", file=sys.stderr, flush=True)
+
+    return total_scratch_cards
+
+def test_count_scratch_cards():
+    lines = [
+        "Card 1: 41 48 83 86 17 | 83 86  6 31 17  9 48 53",
+        "Card 2: 13 32 20 16 61 | 61 30 68 82 17 32 24 19",
+        "Card 3:  1 21 53 59 44 | 69 82 63 72 16 21 14  1",
+        "Card 4: 41 92 73 84 69 | 59 84 76 51 58  5 54 83",
+        "Card 5: 87 83 26 28 32 | 88 30 70 12 93 22 82 36",
+        "Card 6: 31 18 13 56 72 | 74 77 10 23 35 67 36 11"
+    ]
+
+    assert [get_card_matches(line) for line in lines] == [4, 2, 2, 1, 0, 0]
+    assert count_scratch_cards(get_card_matches(line) for line in lines) == 30
+
+    if np is not None:
+        assert count_scratch_cards(get_all_card_matches(lines).tolist()) == 30
+
+def main():
+    args = parse_arguments()
+
+    if args.vectorized:
+        with open_input(args.input_file) as file:
+            total_scratch_cards = count_scratch_cards(get_all_card_matches(file.readlines()).tolist(), args.progress)
+        print(f"Total number of scratch cards: {total_scratch_cards}")
+        return
+
+    # At this point, we need to count how many instances we have in each card, in a single pass over the file
+    with open_input(args.input_file) as file:
+        total_scratch_cards = count_scratch_cards((get_card_matches(line) for line in file if line.strip() != ""), args.progress)
 
     print(f"Total number of scratch cards: {total_scratch_cards}")
 
 if __name__ == "__main__":
+    test_count_scratch_cards()
     main()
\ No newline at end of file
@@ -6,169 +6,484 @@ We create a function of the map that takes the coordinates of the seed and retur
 This function is a bit tricky, because we need to keep track the seed's location as we explore other in-between components (such as temperature, humidity, etc.).
 
 We do this for all seeds, and find the lowest location.
+
+Rather than walking the seven maps for every seed, we compose them once into a single piecewise-linear map:
+a sorted list of breakpoints, where every piece shifts its numbers by a fixed offset. A seed lookup is then one binary search.
+Each map can also be sorted and searched on its own (build_stage_index), which the benchmark compares against the linear scan of get_location.
+With NumPy, a whole array of seeds goes through the sorted maps at once, one searchsorted per stage.
+
+The maps are read by their "X-to-Y map" headers into a graph of stages, so the chain from the seed to the location
+(or between any other two categories) is found by a search over the headers rather than hard-coded.
 """
 
+import re
+import math
+import time
+import random
 import argparse
+from array import array
+from bisect import bisect_right
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NUMPY_CHUNK_SIZE = 16 * 1024 * 1024 # seeds mapped through the stages at once
+
+HEADER_PATTERN = re.compile(r"(\w+)-to-(\w+) map:")
+
+# the seven maps of the example almanac in the puzzle, shared by the tests
+EXAMPLE_STAGES = [
+    [(50, 98, 2), (52, 50, 48)],
+    [(0, 15, 37), (37, 52, 2), (39, 0, 15)],
+    [(49, 53, 8), (0, 11, 42), (42, 0, 7), (57, 7, 4)],
+    [(88, 18, 7), (18, 25, 70)],
+    [(45, 77, 23), (81, 45, 19), (68, 64, 13)],
+    [(0, 69, 1), (1, 0, 69)],
+    [(60, 56, 37), (56, 93, 4)]
+]
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Process input file')
     parser.add_argument('--input_file', type=str, help='Path to the input file')
+    parser.add_argument('--source', type=str, default='seed', help='Category the numbers start from')
+    parser.add_argument('--destination', type=str, default='location', help='Category the numbers are mapped to')
+    parser.add_argument('--numpy', action='store_true', help='Map all the seeds at once with vectorized NumPy operations')
+    parser.add_argument('--benchmark', type=int, metavar='ENTRIES', help='Time the seed lookups on a random almanac with this many entries per map instead of solving the input')
     return parser.parse_args()
 
-def parse_input_file(input_file):
+def parse_almanac(lines):
+    """ Parses the almanac into the seeds and a graph of the stages.
+    Every "X-to-Y map" header starts a new stage that takes the X numbers to the Y numbers, so the chain can be of any length.
+    The graph is a dict {source: {destination: stage_index}}, and each stage is stored as compact arrays sorted by source (see build_stage_index).
+    """
 
     seeds = [] # list of seeds
-    seeds_to_soil = [] # list of tuples (destination, source, num_seeds)
-    soil_to_fertilizer = [] # list of tuples (destination, source, num_seeds)
-    fertilizer_to_water = [] # list of tuples (destination, source, num_seeds)
-    water_to_light = [] # list of tuples (destination, source, num_seeds)
-    light_to_temperature = [] # list of tuples (destination, source, num_seeds)
-    temperature_to_humidity = [] # list of tuples (destination, source, num_seeds)
-    humidity_to_location = [] # list of tuples (destination, source, num_seeds)
-
-    reader_state = "seeds"
+    stage_entries = {} # (source, destination) -> list of tuples (destination, source, num_seeds)
+
+    entries = None
+    for line in lines:
+        line = line.strip()
+
+        # skip lines that are not needed
+        if line == "":
+            continue
+
+        if line.startswith("seeds:"):
+            seeds = [int(seed) for seed in line.split(":")[1].split()]
+            continue
+
+        header = HEADER_PATTERN.fullmatch(line)
+        if header:
+            entries = stage_entries.setdefault(header.groups(), [])
+            continue
+
+        if entries is None:
+            raise Exception(f"Map entry before any map header: {line}")
+
+        destination, source, num_seeds = [int(token) for token in line.split()]
+        entries.append((destination, source, num_seeds))
+
+    almanac = {}
+    for (source, destination), mapping in stage_entries.items():
+        almanac.setdefault(source, {})[destination] = build_stage_index(mapping)
+
+    return seeds, almanac
+
+def find_stage_chain(almanac, source, destination):
+    """ Finds the shortest chain of stages from the source numbers to the destination numbers with a breadth-first search over the graph.
+    Returns the stage indexes in the order the numbers go through them.
+    """
+
+    previous = {source: None}
+    queue = deque([source])
+    while queue:
+        category = queue.popleft()
+        if category == destination:
+            break
+
+        for next_category in almanac.get(category, {}):
+            if next_category not in previous:
+                previous[next_category] = category
+                queue.append(next_category)
+
+    if destination not in previous:
+        raise ValueError(f"No chain of maps from {source} to {destination}")
+
+    # walk back from the destination to collect the stages
+    chain = []
+    category = destination
+    while previous[category] is not None:
+        chain.append(almanac[previous[category]][category])
+        category = previous[category]
+
+    return chain[::-1]
+
+def get_stage_entries(stage_index):
+    """ Turns a stage index back into its (destination, source, num_seeds) entries, sorted by source. """
+
+    starts, ends, destinations = stage_index
+
+    return [(destination, start, end - start) for start, end, destination in zip(starts, ends, destinations)]
+
+def load_stages(input_file, source="seed", destination="location"):
+    """ Reads the almanac and returns the seeds and the entries of every stage on the way from the source to the destination. """
+
     with open(input_file, "r") as file:
-        for line in file:
-            line_tokens = line.split(":")
-
-            if line_tokens[0] == "seeds":
-                seeds = [int(seed) for seed in line_tokens[1].strip().split(" ")]
-            elif line_tokens[0] == "seed-to-soil map":
-                reader_state = "seed_to_soil"
-            elif line_tokens[0] == "soil-to-fertilizer map":
-                reader_state = "soil_to_fertilizer"
-            elif line_tokens[0] == "fertilizer-to-water map":
-                reader_state = "fertilizer_to_water"
-            elif line_tokens[0] == "water-to-light map":
-                reader_state = "water_to_light"
-            elif line_tokens[0] == "light-to-temperature map":
-                reader_state = "light_to_temperature"
-            elif line_tokens[0] == "temperature-to-humidity map":
-                reader_state = "temperature_to_humidity"
-            elif line_tokens[0] == "humidity-to-location map":
-                reader_state = "humidity_to_location"
-            else:
-                # skip lines that are not needed
-                if line.strip() == "":
-                    continue
-
-                destination, source, num_seeds = [int(token) for token in line.strip().split()]
-                # based on the reader state, we add the line to the corresponding map
-                if reader_state == "seed_to_soil":
-                    seeds_to_soil.append((destination, source, num_seeds))
-                elif reader_state == "soil_to_fertilizer":
-                    soil_to_fertilizer.append((destination, source, num_seeds))
-                elif reader_state == "fertilizer_to_water":
-                    fertilizer_to_water.append((destination, source, num_seeds))
-                elif reader_state == "water_to_light":
-                    water_to_light.append((destination, source, num_seeds))
-                elif reader_state == "light_to_temperature":
-                    light_to_temperature.append((destination, source, num_seeds))
-                elif reader_state == "temperature_to_humidity":
-                    temperature_to_humidity.append((destination, source, num_seeds))
-                elif reader_state == "humidity_to_location":
-                    humidity_to_location.append((destination, source, num_seeds))
-                else:
-                    raise Exception(f"Invalid reader state: {reader_state}")
-
-        return seeds, seeds_to_soil, soil_to_fertilizer, fertilizer_to_water, water_to_light, light_to_temperature, temperature_to_humidity, humidity_to_location
-
-def get_location(seed, seeds_to_soil, soil_to_fertilizer, fertilizer_to_water, water_to_light, light_to_temperature, temperature_to_humidity, humidity_to_location):
+        seeds, almanac = parse_almanac(file)
+
+    return seeds, [get_stage_entries(stage_index) for stage_index in find_stage_chain(almanac, source, destination)]
+
+def get_location(seed, stages):
     """ Based on the seed number we find the location of the seed.
-    To do this we track it through soil, fertilizer, etc.
-    To track it we gather the lower bound of the source number of the corresponding component (soil, fertilizer, etc).
-    Then we use this lower bound to find the corresponding destination number.
-    We repeat this for all components until we reach the location.
+    To do this we track it through every stage (soil, fertilizer, etc.) in order.
+    In each stage we look for the entry whose source range holds the number, and use it to find the corresponding destination number.
+    This is a linear scan over the entries, kept as the baseline for the indexed lookups.
     """
 
-    # First we need to find the soil
-    soil = None
-    for destination, source, num_seeds in seeds_to_soil:
-        if seed >= source and source+num_seeds > seed:
-            soil = destination + (seed - source)
-            break
+    number = seed
+    for mapping in stages:
+        for destination, source, num_seeds in mapping:
+            if number >= source and source+num_seeds > number:
+                number = destination + (number - source)
+                break
 
-    # number is not mapped - we assume it is corresponding to the seed
-    if soil is None:
-        soil = seed
+        # number is not mapped - it keeps its value for the next stage
 
-    # Now we need to find the fertilizer
-    fertilizer = None
-    for destination, source, num_seeds in soil_to_fertilizer:
-        if soil >= source and source+num_seeds > soil:
-            fertilizer = destination + (soil - source)
-            break
-    
-    # number is not mapped - we assume it is corresponding to the soil
-    if fertilizer is None:
-        fertilizer = soil
-
-    # Now we need to find the water
-    water = None
-    for destination, source, num_seeds in fertilizer_to_water:
-        if fertilizer >= source and source+num_seeds > fertilizer:
-            water = destination + (fertilizer - source)
-            break
+    return number
 
-    # number is not mapped - we assume it is corresponding to the fertilizer
-    if water is None:
-        water = fertilizer
+def build_stage_index(mapping):
+    """ Sorts the entries of a map by source once, so a number can be found with a binary search instead of a scan over all entries.
+    Returns the (starts, ends, destinations) arrays. The gaps between the entries are not stored - a number that falls into one keeps its value.
+    """
 
-    # Now we need to find the light
-    light = None
-    for destination, source, num_seeds in water_to_light:
-        if water >= source and source+num_seeds > water:
-            light = destination + (water - source)
-            break
+    entries = sorted(mapping, key=lambda x: x[1])
 
-    # number is not mapped - we assume it is corresponding to the water
-    if light is None:
-        light = water
-    
-    # Now we need to find the temperature
-    temperature = None
-    for destination, source, num_seeds in light_to_temperature:
-        if light >= source and source+num_seeds > light:
-            temperature = destination + (light - source)
-            break
+    starts = array('q', (source for _, source, _ in entries))
+    ends = array('q', (source + num_seeds for _, source, num_seeds in entries))
+    destinations = array('q', (destination for destination, _, _ in entries))
 
-    # number is not mapped - we assume it is corresponding to the light
-    if temperature is None:
-        temperature = light
+    return starts, ends, destinations
 
-    # Now we need to find the humidity
-    humidity = None
-    for destination, source, num_seeds in temperature_to_humidity:
-        if temperature >= source and source+num_seeds > temperature:
-            humidity = destination + (temperature - source)
-            break
+def lookup_stage(stage_index, number):
+    """ Maps a number through a single stage with one binary search. """
 
-    # number is not mapped - we assume it is corresponding to the temperature
-    if humidity is None:
-        humidity = temperature
+    starts, ends, destinations = stage_index
 
-    # Now we need to find the location
-    location = None
-    for destination, source, num_seeds in humidity_to_location:
-        if humidity >= source and source+num_seeds > humidity:
-            location = destination + (humidity - source)
-            break
+    # the last entry that starts at or before the number is the only one that can hold it
+    entry_idx = bisect_right(starts, number) - 1
+
+    # number is before the first entry or in a gap - it is not mapped
+    if entry_idx < 0 or number >= ends[entry_idx]:
+        return number
+
+    return destinations[entry_idx] + (number - starts[entry_idx])
+
+def walk_stage_indexes(number, stage_indexes):
+    """ Maps a number through all the stages, in order. """
+
+    for stage_index in stage_indexes:
+        number = lookup_stage(stage_index, number)
+
+    return number
+
+def build_stage_arrays(mapping):
+    """ Turns the bisect index of a map into NumPy arrays of the entry starts, ends and offsets (destination - source). """
+
+    starts, ends, destinations = build_stage_index(mapping)
+
+    starts = np.array(starts, dtype=np.int64)
+    ends = np.array(ends, dtype=np.int64)
+    offsets = np.array(destinations, dtype=np.int64) - starts
+
+    return starts, ends, offsets
+
+def map_seeds_chunk(values, stage_arrays):
+    """ Maps an int64 array through all the stages in place. """
+
+    for starts, ends, offsets in stage_arrays:
+        if starts.size == 0:
+            continue
+
+        # the last entry that starts at or before the number, clipped to the first one for numbers before all entries
+        entry_idx = np.searchsorted(starts, values, side='right') - 1
+        np.maximum(entry_idx, 0, out=entry_idx)
+
+        # only the numbers that fall into their entry are moved, the rest are not mapped
+        mapped = (values >= starts[entry_idx]) & (values < ends[entry_idx])
+        np.add(values, offsets[entry_idx], out=values, where=mapped)
+
+def get_locations_numpy(seeds, stages, chunk_size=NUMPY_CHUNK_SIZE, out=None):
+    """ Maps an int64 array of seeds to their locations without a Python loop over the seeds.
+    The seeds are processed chunk by chunk, so the temporary arrays stay small however many seeds there are.
+    Pass out=seeds to map a very large array in place.
+    """
+
+    if np is None:
+        raise ImportError("The --numpy mode requires numpy to be installed")
+
+    seeds = np.asarray(seeds, dtype=np.int64)
+    locations = np.empty_like(seeds) if out is None else out
+    stage_arrays = [build_stage_arrays(mapping) for mapping in stages]
+
+    for start in range(0, seeds.size, chunk_size):
+        chunk = locations[start:start + chunk_size]
+        chunk[...] = seeds[start:start + chunk_size]
+        map_seeds_chunk(chunk, stage_arrays)
+
+    return locations
 
-    # number is not mapped - we assume it is corresponding to the humidity
-    if location is None:
-        location = humidity
+def append_piece(breakpoints, offsets, start, offset):
+    """ Appends the piece [start, ...) with the given offset to a piecewise map, merging it with the last piece if it has the same offset. """
 
-    return location
+    if breakpoints and breakpoints[-1] == start:
+        offsets[-1] = offset
+    elif not offsets or offsets[-1] != offset:
+        breakpoints.append(start)
+        offsets.append(offset)
+
+def build_piecewise_map(mapping):
+    """ Turns a map of (destination, source, num_seeds) entries into a piecewise-linear map (breakpoints, offsets).
+    The number x in [breakpoints[i], breakpoints[i+1]) maps to x + offsets[i], and the last piece goes on forever.
+    Numbers outside of every entry are not mapped, so their pieces have an offset of 0. The numbers start at 0.
+    """
+
+    breakpoints = [0]
+    offsets = [0]
+    covered_until = 0
+    for destination, source, num_seeds in sorted(mapping, key=lambda x: x[1]):
+        start = max(source, covered_until)
+        end = source + num_seeds
+        if start >= end:
+            continue
+
+        if start > covered_until:
+            append_piece(breakpoints, offsets, covered_until, 0)
+        append_piece(breakpoints, offsets, start, destination - source)
+        covered_until = end
+
+    append_piece(breakpoints, offsets, covered_until, 0)
+
+    return breakpoints, offsets
+
+def apply_piecewise_map(piecewise_map, value):
+    """ Maps a single number through a piecewise-linear map with one binary search. """
+
+    breakpoints, offsets = piecewise_map
+
+    return value + offsets[bisect_right(breakpoints, value) - 1]
+
+def compose_piecewise_maps(first, second):
+    """ Returns the piecewise-linear map of second(first(x)).
+    Every piece of first is shifted by its offset and cut where it crosses the breakpoints of second.
+    """
+
+    first_breakpoints, first_offsets = first
+    second_breakpoints, second_offsets = second
+
+    breakpoints = []
+    offsets = []
+    for piece_idx, (start, offset) in enumerate(zip(first_breakpoints, first_offsets)):
+        end = first_breakpoints[piece_idx + 1] if piece_idx + 1 < len(first_breakpoints) else math.inf
+
+        # walk the pieces of second that the image [start + offset, end + offset) falls into
+        image_start = start + offset
+        second_idx = bisect_right(second_breakpoints, image_start) - 1
+        while True:
+            append_piece(breakpoints, offsets, image_start - offset, offset + second_offsets[second_idx])
+
+            next_breakpoint = second_breakpoints[second_idx + 1] if second_idx + 1 < len(second_breakpoints) else math.inf
+            if next_breakpoint >= end + offset:
+                break
+            image_start = next_breakpoint
+            second_idx += 1
+
+    return breakpoints, offsets
+
+def compose_almanac(stages):
+    """ Composes the maps of all the stages, in order, into a single piecewise-linear map. """
+
+    composed_map = ([0], [0])
+    for mapping in stages:
+        composed_map = compose_piecewise_maps(composed_map, build_piecewise_map(mapping))
+
+    return composed_map
+
+def test_parse_almanac():
+    lines = """seeds: 79 14 55 13
+
+seed-to-soil map:
+50 98 2
+52 50 48
+
+soil-to-fertilizer map:
+0 15 37
+37 52 2
+39 0 15
+
+fertilizer-to-water map:
+49 53 8
+0 11 42
+42 0 7
+57 7 4
+
+water-to-light map:
+88 18 7
+18 25 70
+
+light-to-temperature map:
+45 77 23
+81 45 19
+68 64 13
+
+temperature-to-humidity map:
+0 69 1
+1 0 69
+
+humidity-to-location map:
+60 56 37
+56 93 4
+
+location-to-plot map:
+10 0 50
+
+soil-to-plot map:
+0 0 1000
+""".splitlines()
+    seeds, almanac = parse_almanac(lines)
+
+    assert len(find_stage_chain(almanac, "seed", "location")) == 7
+    assert len(find_stage_chain(almanac, "water", "location")) == 4
+    # the shortest chain to the plot skips the rest of the stages
+    assert len(find_stage_chain(almanac, "seed", "plot")) == 2
+
+    stages = [get_stage_entries(stage_index) for stage_index in find_stage_chain(almanac, "seed", "location")]
+    assert stages[0] == [(52, 50, 48), (50, 98, 2)]
+    assert min(get_location(seed, stages) for seed in seeds) == 35
+
+def test_compose_almanac():
+    stages = EXAMPLE_STAGES
+    location_map = compose_almanac(stages)
+
+    for seed in range(120):
+        assert apply_piecewise_map(location_map, seed) == get_location(seed, stages)
+    assert [apply_piecewise_map(location_map, seed) for seed in [79, 14, 55, 13]] == [82, 43, 86, 35]
+
+def test_stage_indexes():
+    stages = EXAMPLE_STAGES
+    stage_indexes = [build_stage_index(mapping) for mapping in stages]
+
+    for seed in range(120):
+        assert walk_stage_indexes(seed, stage_indexes) == get_location(seed, stages)
+
+    stages = generate_almanac(50)
+    stage_indexes = [build_stage_index(mapping) for mapping in stages]
+    rng = random.Random(1)
+    for seed in [rng.randrange(50_000_000) for _ in range(1000)]:
+        assert walk_stage_indexes(seed, stage_indexes) == get_location(seed, stages)
+
+def test_get_locations_numpy():
+    stages = EXAMPLE_STAGES
+    seeds = np.arange(120, dtype=np.int64)
+    locations = get_locations_numpy(seeds, stages, chunk_size=7)
+    assert locations.tolist() == [get_location(seed, stages) for seed in range(120)]
+
+    stages = generate_almanac(50)
+    seeds = np.random.default_rng(1).integers(0, 50_000_000, size=1000)
+    expected = [get_location(seed, stages) for seed in seeds.tolist()]
+    assert get_locations_numpy(seeds, stages, chunk_size=64).tolist() == expected
+    get_locations_numpy(seeds, stages, out=seeds)
+    assert seeds.tolist() == expected
+
+def generate_almanac(num_entries, random_seed=0):
+    """ Generates seven random maps of num_entries entries each, shaped like the puzzle ones.
+    The source ranges never overlap and some of them have gaps in-between. The destinations are the same blocks in a shuffled order.
+    """
+
+    rng = random.Random(random_seed)
+
+    stages = []
+    for _ in range(7):
+        sizes = [rng.randint(1, 1_000_000) for _ in range(num_entries)]
+
+        sources = []
+        position = 0
+        for size in sizes:
+            # leave a gap before roughly a quarter of the entries
+            if rng.random() < 0.25:
+                position += rng.randint(1, 1_000_000)
+            sources.append(position)
+            position += size
+
+        destinations = [0] * num_entries
+        position = 0
+        for entry_idx in rng.sample(range(num_entries), num_entries):
+            destinations[entry_idx] = position
+            position += sizes[entry_idx]
+
+        mapping = list(zip(destinations, sources, sizes))
+        rng.shuffle(mapping)
+        stages.append(mapping)
+
+    return stages
+
+def benchmark_lookups(num_entries, num_seeds=10_000):
+    """ Times the linear scan, the bisect index of each map and the composed map over the same random seeds and almanac. """
+
+    stages = generate_almanac(num_entries)
+    span = max(source + size for mapping in stages for _, source, size in mapping)
+    rng = random.Random(1)
+    seeds = [rng.randrange(span) for _ in range(num_seeds)]
+
+    start_time = time.perf_counter()
+    stage_indexes = [build_stage_index(mapping) for mapping in stages]
+    location_map = compose_almanac(stages)
+    print(f"Built the indexes in {time.perf_counter() - start_time:.3f}s, the composed map has {len(location_map[0])} pieces")
+
+    lookups = [
+        ("linear", lambda seed: get_location(seed, stages)),
+        ("bisect index", lambda seed: walk_stage_indexes(seed, stage_indexes)),
+        ("composed", lambda seed: apply_piecewise_map(location_map, seed))
+    ]
+    for name, get_seed_location in lookups:
+        start_time = time.perf_counter()
+        lowest_location = min(get_seed_location(seed) for seed in seeds)
+        elapsed = time.perf_counter() - start_time
+
+        print(f"{name}: lowest location {lowest_location}, {elapsed:.3f}s, {num_seeds / elapsed:.0f} seeds/s")
+
+    if np is not None:
+        seeds = np.array(seeds, dtype=np.int64)
+        start_time = time.perf_counter()
+        lowest_location = get_locations_numpy(seeds, stages).min()
+        elapsed = time.perf_counter() - start_time
+
+        print(f"numpy: lowest location {lowest_location}, {elapsed:.3f}s, {num_seeds / elapsed:.0f} seeds/s")
 
 def main():
     args = parse_arguments()
-    seeds, seeds_to_soil, soil_to_fertilizer, fertilizer_to_water, water_to_light, light_to_temperature, temperature_to_humidity, humidity_to_location = parse_input_file(args.input_file)
+
+    if args.benchmark:
+        benchmark_lookups(args.benchmark)
+        return
+
+    seeds, stages = load_stages(args.input_file, args.source, args.destination)
+
+    if args.numpy:
+        lowest_location = get_locations_numpy(seeds, stages).min()
+        print(f"Lowest location: {lowest_location}")
+        return
+
+    # Compose the maps once, so every seed is a single lookup
+    location_map = compose_almanac(stages)
 
     # Now we need to find the lowest location
     lowest_location = None
     for seed in seeds:
         # we need to find the location of the seed
-        location = get_location(seed, seeds_to_soil, soil_to_fertilizer, fertilizer_to_water, water_to_light, light_to_temperature, temperature_to_humidity, humidity_to_location)
+        location = apply_piecewise_map(location_map, seed)
         
         if lowest_location is None or location < lowest_location:
             lowest_location = location
@@ -176,4 +491,9 @@ def main():
     print(f"Lowest location: {lowest_location}")
 
 if __name__ == "__main__":
+    test_parse_almanac()
+    test_compose_almanac()
+    test_stage_indexes()
+    if np is not None:
+        test_get_locations_numpy()
     main()
\ No newline at end of file
@@ -19,246 +19,553 @@ This will go from 2 billion to 170 million seed numbers.
 
 We can do even better by using a different approach.
 We can make use of the range of the seed numbers.
+Instead of single numbers, we push whole seed ranges through each map. Where a range crosses the start or the end of a mapping entry,
+we split it - the part inside the entry is shifted to its destination, and the parts outside of every entry keep their numbers.
+After the last map, the lowest location is the start of the lowest location range.
+The work now depends on the number of ranges and mapping entries, not on how many seed numbers the ranges hold.
 
+For the single number lookups, we compose the seven maps once into a single piecewise-linear map (and another one for the way back):
+a sorted list of breakpoints, where every piece shifts its numbers by a fixed offset. A lookup is then one binary search.
+Each map can also be sorted and searched on its own (build_stage_index), which the benchmark compares against the linear scan of get_seed.
 
+The maps are read by their "X-to-Y map" headers into a graph of stages, so the chain from the seed to the location
+(or between any other two categories) is found by a search over the headers rather than hard-coded.
+The parsed almanac is cached by the hash of the input (see load_almanac), so the self-tests and the solution parse it only once.
 
+The backwards search can also run on a pool of workers. The locations from 0 upwards are split into ordered chunks, and the first chunk
+(in order) with a valid seed holds the lowest location - the later chunks are then cancelled.
 """
 
+import os
+import re
+import math
+import pickle
+import hashlib
+import tempfile
+import time
+import random
 import argparse
+import multiprocessing
+from array import array
+from bisect import bisect_right
+from itertools import islice
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+HEADER_PATTERN = re.compile(r"(\w+)-to-(\w+) map:")
+
+# the seven maps of the example almanac in the puzzle, shared by the tests
+EXAMPLE_STAGES = [
+    [(50, 98, 2), (52, 50, 48)],
+    [(0, 15, 37), (37, 52, 2), (39, 0, 15)],
+    [(49, 53, 8), (0, 11, 42), (42, 0, 7), (57, 7, 4)],
+    [(88, 18, 7), (18, 25, 70)],
+    [(45, 77, 23), (81, 45, 19), (68, 64, 13)],
+    [(0, 69, 1), (1, 0, 69)],
+    [(60, 56, 37), (56, 93, 4)]
+]
+
+ALMANAC_CACHE = {} # input hash -> (seeds, almanac), so the input is parsed once per run
+SCAN_CHUNK_SIZE = 1_000_000 # locations a worker scans at once
+SCAN_CHECK_INTERVAL = 10_000 # locations a worker scans between two checks for a lower hit
+
+scan_state = {} # the maps of the scan, set once in every worker process
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Process input file')
     parser.add_argument('--input_file', type=str, help='Path to the input file')
+    parser.add_argument('--source', type=str, default='seed', help='Category the numbers start from')
+    parser.add_argument('--destination', type=str, default='location', help='Category the numbers are mapped to')
+    parser.add_argument('--benchmark', type=int, metavar='ENTRIES', help='Time the location to seed lookups on a random almanac with this many entries per map instead of solving the input')
+    parser.add_argument('--cache_dir', type=str, help='Directory to keep snapshots of the parsed almanacs in, keyed by the hash of the input')
+    parser.add_argument('--self-test', action='store_true', help='Run the unit tests before solving the input')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes scanning the locations in ordered chunks')
+    parser.add_argument('--ranges', action='store_true', help='Push the seed ranges through the maps instead of searching the locations one by one')
     return parser.parse_args()
 
-def parse_input_file(input_file):
+def parse_almanac(lines):
+    """ Parses the almanac into the seeds and a graph of the stages.
+    Every "X-to-Y map" header starts a new stage that takes the X numbers to the Y numbers, so the chain can be of any length.
+    The graph is a dict {source: {destination: stage_index}}, and each stage is stored as compact arrays sorted by source (see build_stage_index).
+    """
 
     seeds = [] # list of seeds
-    seeds_to_soil = [] # list of tuples (destination, source, num_seeds)
-    soil_to_fertilizer = [] # list of tuples (destination, source, num_seeds)
-    fertilizer_to_water = [] # list of tuples (destination, source, num_seeds)
-    water_to_light = [] # list of tuples (destination, source, num_seeds)
-    light_to_temperature = [] # list of tuples (destination, source, num_seeds)
-    temperature_to_humidity = [] # list of tuples (destination, source, num_seeds)
-    humidity_to_location = [] # list of tuples (destination, source, num_seeds)
-
-    reader_state = "seeds"
+    stage_entries = {} # (source, destination) -> list of tuples (destination, source, num_seeds)
+
+    entries = None
+    for line in lines:
+        line = line.strip()
+
+        # skip lines that are not needed
+        if line == "":
+            continue
+
+        if line.startswith("seeds:"):
+            seeds_pairs = [int(seed) for seed in line.split(":")[1].split()]
+            for seed_idx, seed in enumerate(seeds_pairs[0::2]):
+                seeds.append(range(seed, seed+seeds_pairs[2*seed_idx+1]))
+            continue
+
+        header = HEADER_PATTERN.fullmatch(line)
+        if header:
+            entries = stage_entries.setdefault(header.groups(), [])
+            continue
+
+        if entries is None:
+            raise Exception(f"Map entry before any map header: {line}")
+
+        destination, source, num_seeds = [int(token) for token in line.split()]
+        entries.append((destination, source, num_seeds))
+
+    almanac = {}
+    for (source, destination), mapping in stage_entries.items():
+        almanac.setdefault(source, {})[destination] = build_stage_index(mapping)
+
+    return seeds, almanac
+
+def find_stage_chain(almanac, source, destination):
+    """ Finds the shortest chain of stages from the source numbers to the destination numbers with a breadth-first search over the graph.
+    Returns the stage indexes in the order the numbers go through them.
+    """
+
+    previous = {source: None}
+    queue = deque([source])
+    while queue:
+        category = queue.popleft()
+        if category == destination:
+            break
+
+        for next_category in almanac.get(category, {}):
+            if next_category not in previous:
+                previous[next_category] = category
+                queue.append(next_category)
+
+    if destination not in previous:
+        raise ValueError(f"No chain of maps from {source} to {destination}")
+
+    # walk back from the destination to collect the stages
+    chain = []
+    category = destination
+    while previous[category] is not None:
+        chain.append(almanac[previous[category]][category])
+        category = previous[category]
+
+    return chain[::-1]
+
+def get_stage_entries(stage_index):
+    """ Turns a stage index back into its (destination, source, num_seeds) entries, sorted by source. """
+
+    starts, ends, destinations = stage_index
+
+    return [(destination, start, end - start) for start, end, destination in zip(starts, ends, destinations)]
+
+def hash_input_file(input_file):
+    """ Returns the SHA-256 hex digest of the input file, read in blocks. """
+
+    digest = hashlib.sha256()
+    with open(input_file, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+def load_almanac(input_file, cache_dir=None):
+    """ Parses the almanac once and returns the cached (seeds, almanac) on the following calls.
+    The cache is keyed by the hash of the input, so a changed file is parsed again.
+    With a cache_dir, the parsed almanac is also kept there as a pickled snapshot, which later runs load instead of parsing.
+    """
+
+    input_hash = hash_input_file(input_file)
+    if input_hash in ALMANAC_CACHE:
+        return ALMANAC_CACHE[input_hash]
+
+    snapshot_file = os.path.join(cache_dir, f"{input_hash}.almanac") if cache_dir else None
+    if snapshot_file and os.path.exists(snapshot_file):
+        with open(snapshot_file, "rb") as file:
+            ALMANAC_CACHE[input_hash] = pickle.load(file)
+        return ALMANAC_CACHE[input_hash]
+
     with open(input_file, "r") as file:
-        for line in file:
-            line_tokens = line.split(":")
-
-            if line_tokens[0] == "seeds":
-                seeds_pairs = [int(seed) for seed in line_tokens[1].strip().split(" ")]
-                for seed_idx, seed in enumerate(seeds_pairs[0::2]):
-                    seeds.append((range(seed, seed+seeds_pairs[2*seed_idx+1])))                
-            elif line_tokens[0] == "seed-to-soil map":
-                reader_state = "seed_to_soil"
-            elif line_tokens[0] == "soil-to-fertilizer map":
-                reader_state = "soil_to_fertilizer"
-            elif line_tokens[0] == "fertilizer-to-water map":
-                reader_state = "fertilizer_to_water"
-            elif line_tokens[0] == "water-to-light map":
-                reader_state = "water_to_light"
-            elif line_tokens[0] == "light-to-temperature map":
-                reader_state = "light_to_temperature"
-            elif line_tokens[0] == "temperature-to-humidity map":
-                reader_state = "temperature_to_humidity"
-            elif line_tokens[0] == "humidity-to-location map":
-                reader_state = "humidity_to_location"
-            else:
-                # skip lines that are not needed
-                if line.strip() == "":
-                    continue
-
-                destination, source, num_seeds = [int(token) for token in line.strip().split()]
-                # based on the reader state, we add the line to the corresponding map
-                if reader_state == "seed_to_soil":
-                    seeds_to_soil.append((destination, source, num_seeds))
-                elif reader_state == "soil_to_fertilizer":
-                    soil_to_fertilizer.append((destination, source, num_seeds))
-                elif reader_state == "fertilizer_to_water":
-                    fertilizer_to_water.append((destination, source, num_seeds))
-                elif reader_state == "water_to_light":
-                    water_to_light.append((destination, source, num_seeds))
-                elif reader_state == "light_to_temperature":
-                    light_to_temperature.append((destination, source, num_seeds))
-                elif reader_state == "temperature_to_humidity":
-                    temperature_to_humidity.append((destination, source, num_seeds))
-                elif reader_state == "humidity_to_location":
-                    humidity_to_location.append((destination, source, num_seeds))
-                else:
-                    raise Exception(f"Invalid reader state: {reader_state}")
-
-        return seeds, seeds_to_soil, soil_to_fertilizer, fertilizer_to_water, water_to_light, light_to_temperature, temperature_to_humidity, humidity_to_location
-
-def get_location(seed, seeds_to_soil, soil_to_fertilizer, fertilizer_to_water, water_to_light, light_to_temperature, temperature_to_humidity, humidity_to_location):
+        ALMANAC_CACHE[input_hash] = parse_almanac(file)
+
+    if snapshot_file:
+        # write the snapshot next to its final name and move it in place, so a reader never sees half of it
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile("wb", dir=cache_dir, delete=False) as file:
+            pickle.dump(ALMANAC_CACHE[input_hash], file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(file.name, snapshot_file)
+
+    return ALMANAC_CACHE[input_hash]
+
+def load_stages(input_file, source="seed", destination="location", cache_dir=None):
+    """ Reads the almanac and returns the seeds and the entries of every stage on the way from the source to the destination. """
+
+    seeds, almanac = load_almanac(input_file, cache_dir)
+
+    return seeds, [get_stage_entries(stage_index) for stage_index in find_stage_chain(almanac, source, destination)]
+
+def get_location(seed, stages):
     """ Based on the seed number we find the location of the seed.
-    To do this we track it through soil, fertilizer, etc.
-    To track it we gather the lower bound of the source number of the corresponding component (soil, fertilizer, etc).
-    Then we use this lower bound to find the corresponding destination number.
-    We repeat this for all components until we reach the location.
+    To do this we track it through every stage (soil, fertilizer, etc.) in order.
+    In each stage we look for the entry whose source range holds the number, and use it to find the corresponding destination number.
+    This is a linear scan over the entries, kept as the baseline for the indexed lookups.
     """
 
-    # First we need to find the soil
-    soil = None
-    for destination, source, num_seeds in seeds_to_soil:
-        if seed >= source and source+num_seeds > seed:
-            soil = destination + (seed - source)
-            break
+    number = seed
+    for mapping in stages:
+        for destination, source, num_seeds in mapping:
+            if number >= source and source+num_seeds > number:
+                number = destination + (number - source)
+                break
 
-    # number is not mapped - we assume it is corresponding to the seed
-    if soil is None:
-        soil = seed
+        # number is not mapped - it keeps its value for the next stage
 
-    # Now we need to find the fertilizer
-    fertilizer = None
-    for destination, source, num_seeds in soil_to_fertilizer:
-        if soil >= source and source+num_seeds > soil:
-            fertilizer = destination + (soil - source)
-            break
-    
-    # number is not mapped - we assume it is corresponding to the soil
-    if fertilizer is None:
-        fertilizer = soil
-
-    # Now we need to find the water
-    water = None
-    for destination, source, num_seeds in fertilizer_to_water:
-        if fertilizer >= source and source+num_seeds > fertilizer:
-            water = destination + (fertilizer - source)
-            break
+    return number
 
-    # number is not mapped - we assume it is corresponding to the fertilizer
-    if water is None:
-        water = fertilizer
+def get_seed(location, stages):
+    """ Based on the location number we find the seed, walking the stages backwards from the destination to the source."""
 
-    # Now we need to find the light
-    light = None
-    for destination, source, num_seeds in water_to_light:
-        if water >= source and source+num_seeds > water:
-            light = destination + (water - source)
-            break
+    number = location
+    for mapping in reversed(stages):
+        for destination, source, num_seeds in mapping:
+            if number >= destination and destination+num_seeds > number:
+                number = source + (number - destination)
+                break
 
-    # number is not mapped - we assume it is corresponding to the water
-    if light is None:
-        light = water
-    
-    # Now we need to find the temperature
-    temperature = None
-    for destination, source, num_seeds in light_to_temperature:
-        if light >= source and source+num_seeds > light:
-            temperature = destination + (light - source)
-            break
+        # number is not mapped - it keeps its value for the previous stage
 
-    # number is not mapped - we assume it is corresponding to the light
-    if temperature is None:
-        temperature = light
+    return number
 
-    # Now we need to find the humidity
-    humidity = None
-    for destination, source, num_seeds in temperature_to_humidity:
-        if temperature >= source and source+num_seeds > temperature:
-            humidity = destination + (temperature - source)
-            break
+def build_stage_index(mapping):
+    """ Sorts the entries of a map by source once, so a number can be found with a binary search instead of a scan over all entries.
+    Returns the (starts, ends, destinations) arrays. The gaps between the entries are not stored - a number that falls into one keeps its value.
+    """
 
-    # number is not mapped - we assume it is corresponding to the temperature
-    if humidity is None:
-        humidity = temperature
+    entries = sorted(mapping, key=lambda x: x[1])
 
-    # Now we need to find the location
-    location = None
-    for destination, source, num_seeds in humidity_to_location:
-        if humidity >= source and source+num_seeds > humidity:
-            location = destination + (humidity - source)
-            break
+    starts = array('q', (source for _, source, _ in entries))
+    ends = array('q', (source + num_seeds for _, source, num_seeds in entries))
+    destinations = array('q', (destination for destination, _, _ in entries))
 
-    # number is not mapped - we assume it is corresponding to the humidity
-    if location is None:
-        location = humidity
+    return starts, ends, destinations
 
-    return location
+def lookup_stage(stage_index, number):
+    """ Maps a number through a single stage with one binary search. """
 
-def get_seed(location, seeds_to_soil, soil_to_fertilizer, fertilizer_to_water, water_to_light, light_to_temperature, temperature_to_humidity, humidity_to_location):
-    """ Based on the location range we find the seed range."""
-    
-    # First we need to find the humidity
-    humidity = None
-    for source, destination, num_seeds in humidity_to_location:
-        if location >= source and source+num_seeds > location:
-            humidity = destination + (location - source)
-            break
+    starts, ends, destinations = stage_index
 
-    # number is not mapped - we assume it is corresponding to the location
-    if humidity is None:
-        humidity = location
+    # the last entry that starts at or before the number is the only one that can hold it
+    entry_idx = bisect_right(starts, number) - 1
 
-    # Now we need to find the temperature
-    temperature = None
-    for source, destination, num_seeds in temperature_to_humidity:
-        if humidity >= source and source+num_seeds > humidity:
-            temperature = destination + (humidity - source)
-            break
+    # number is before the first entry or in a gap - it is not mapped
+    if entry_idx < 0 or number >= ends[entry_idx]:
+        return number
 
-    # number is not mapped - we assume it is corresponding to the humidity
-    if temperature is None:
-        temperature = humidity
+    return destinations[entry_idx] + (number - starts[entry_idx])
 
-    # Now we need to find the light
-    light = None
-    for source, destination, num_seeds in light_to_temperature:
-        if temperature >= source and source+num_seeds > temperature:
-            light = destination + (temperature - source)
-            break
+def walk_stage_indexes(number, stage_indexes):
+    """ Maps a number through all the stages, in order. """
 
-    # number is not mapped - we assume it is corresponding to the temperature
-    if light is None:
-        light = temperature
+    for stage_index in stage_indexes:
+        number = lookup_stage(stage_index, number)
 
-    # Now we need to find the water
-    water = None
-    for source, destination, num_seeds in water_to_light:
-        if light >= source and source+num_seeds > light:
-            water = destination + (light - source)
-            break
+    return number
 
-    # number is not mapped - we assume it is corresponding to the light
-    if water is None:
-        water = light
+def append_piece(breakpoints, offsets, start, offset):
+    """ Appends the piece [start, ...) with the given offset to a piecewise map, merging it with the last piece if it has the same offset. """
 
-    # Now we need to find the fertilizer
-    fertilizer = None
-    for source, destination, num_seeds in fertilizer_to_water:
-        if water >= source and source+num_seeds > water:
-            fertilizer = destination + (water - source)
-            break
+    if breakpoints and breakpoints[-1] == start:
+        offsets[-1] = offset
+    elif not offsets or offsets[-1] != offset:
+        breakpoints.append(start)
+        offsets.append(offset)
 
-    # number is not mapped - we assume it is corresponding to the water
-    if fertilizer is None:
-        fertilizer = water
+def build_piecewise_map(mapping):
+    """ Turns a map of (destination, source, num_seeds) entries into a piecewise-linear map (breakpoints, offsets).
+    The number x in [breakpoints[i], breakpoints[i+1]) maps to x + offsets[i], and the last piece goes on forever.
+    Numbers outside of every entry are not mapped, so their pieces have an offset of 0. The numbers start at 0.
+    """
 
-    # Now we need to find the soil
-    soil = None
-    for source, destination, num_seeds in soil_to_fertilizer:
-        if fertilizer >= source and source+num_seeds > fertilizer:
-            soil = destination + (fertilizer - source)
-            break
+    breakpoints = [0]
+    offsets = [0]
+    covered_until = 0
+    for destination, source, num_seeds in sorted(mapping, key=lambda x: x[1]):
+        start = max(source, covered_until)
+        end = source + num_seeds
+        if start >= end:
+            continue
 
-    # number is not mapped - we assume it is corresponding to the fertilizer
-    if soil is None:
-        soil = fertilizer
-    
-    # Now we need to find the seed
-    seed = None
-    for source, destination, num_seeds in seeds_to_soil:
-        if soil >= source and source+num_seeds > soil:
-            seed = destination + (soil - source)
-            break
+        if start > covered_until:
+            append_piece(breakpoints, offsets, covered_until, 0)
+        append_piece(breakpoints, offsets, start, destination - source)
+        covered_until = end
+
+    append_piece(breakpoints, offsets, covered_until, 0)
+
+    return breakpoints, offsets
+
+def apply_piecewise_map(piecewise_map, value):
+    """ Maps a single number through a piecewise-linear map with one binary search. """
 
-    # number is not mapped - we assume it is corresponding to the soil
-    if seed is None:
-        seed = soil
+    breakpoints, offsets = piecewise_map
 
-    return seed
+    return value + offsets[bisect_right(breakpoints, value) - 1]
+
+def compose_piecewise_maps(first, second):
+    """ Returns the piecewise-linear map of second(first(x)).
+    Every piece of first is shifted by its offset and cut where it crosses the breakpoints of second.
+    """
+
+    first_breakpoints, first_offsets = first
+    second_breakpoints, second_offsets = second
+
+    breakpoints = []
+    offsets = []
+    for piece_idx, (start, offset) in enumerate(zip(first_breakpoints, first_offsets)):
+        end = first_breakpoints[piece_idx + 1] if piece_idx + 1 < len(first_breakpoints) else math.inf
+
+        # walk the pieces of second that the image [start + offset, end + offset) falls into
+        image_start = start + offset
+        second_idx = bisect_right(second_breakpoints, image_start) - 1
+        while True:
+            append_piece(breakpoints, offsets, image_start - offset, offset + second_offsets[second_idx])
+
+            next_breakpoint = second_breakpoints[second_idx + 1] if second_idx + 1 < len(second_breakpoints) else math.inf
+            if next_breakpoint >= end + offset:
+                break
+            image_start = next_breakpoint
+            second_idx += 1
+
+    return breakpoints, offsets
+
+def compose_almanac(stages):
+    """ Composes the maps of all the stages, in order, into a single piecewise-linear map. """
+
+    composed_map = ([0], [0])
+    for mapping in stages:
+        composed_map = compose_piecewise_maps(composed_map, build_piecewise_map(mapping))
+
+    return composed_map
+
+def invert_stages(stages):
+    """ Returns the maps that take us back from the last stage to the first one, the way get_seed walks them. """
+
+    return [[(source, destination, num_seeds) for destination, source, num_seeds in mapping] for mapping in reversed(stages)]
+
+def merge_ranges(ranges):
+    """ Returns the ranges [start, end) sorted, with the overlapping and touching ones merged. """
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+def map_ranges(ranges, mapping):
+    """ Pushes the ranges [start, end) through a map of (destination, source, num_seeds) entries.
+    A range is split where it crosses the start or the end of an entry: the part inside the entry is shifted to the destination,
+    and the parts outside of every entry keep their numbers.
+    """
+
+    mapping = sorted(mapping, key=lambda x: x[1])
+
+    mapped_ranges = []
+    for start, end in merge_ranges(ranges):
+        for destination, source, num_seeds in mapping:
+            # the entries are sorted, so we can skip the ones before the range and stop at the first one after it
+            if source + num_seeds <= start:
+                continue
+            if source >= end:
+                break
+
+            # the gap before the entry is not mapped
+            if source > start:
+                mapped_ranges.append((start, source))
+                start = source
+
+            overlap_end = min(end, source + num_seeds)
+            mapped_ranges.append((destination + (start - source), destination + (overlap_end - source)))
+            start = overlap_end
+
+            if start >= end:
+                break
+
+        # whatever is left after the last entry is not mapped either
+        if start < end:
+            mapped_ranges.append((start, end))
+
+    return mapped_ranges
+
+def get_lowest_location_by_ranges(seeds, stages):
+    """ Returns the lowest location of all the seed ranges, pushing the ranges through each of the stages (maps) in order. """
+
+    ranges = [(seed_range.start, seed_range.stop) for seed_range in seeds if len(seed_range) > 0]
+    for mapping in stages:
+        ranges = map_ranges(ranges, mapping)
+
+    return min(start for start, _ in ranges)
+
+def test_map_ranges():
+    """We test the range splitting on the example from the puzzle."""
+
+    mapping = [(50, 98, 2), (52, 50, 48)]
+
+    assert map_ranges([(79, 93)], mapping) == [(81, 95)]
+    assert map_ranges([(40, 100)], mapping) == [(40, 50), (52, 100), (50, 52)]
+    assert map_ranges([(100, 110), (0, 5)], mapping) == [(0, 5), (100, 110)]
+
+    stages = EXAMPLE_STAGES
+    assert get_lowest_location_by_ranges([range(79, 79+14), range(55, 55+13)], stages) == 46
+
+def test_parse_almanac():
+    lines = """seeds: 79 14 55 13
+
+seed-to-soil map:
+50 98 2
+52 50 48
+
+soil-to-fertilizer map:
+0 15 37
+37 52 2
+39 0 15
+
+fertilizer-to-water map:
+49 53 8
+0 11 42
+42 0 7
+57 7 4
+
+water-to-light map:
+88 18 7
+18 25 70
+
+light-to-temperature map:
+45 77 23
+81 45 19
+68 64 13
+
+temperature-to-humidity map:
+0 69 1
+1 0 69
+
+humidity-to-location map:
+60 56 37
+56 93 4
+
+location-to-plot map:
+10 0 50
+
+soil-to-plot map:
+0 0 1000
+""".splitlines()
+    seeds, almanac = parse_almanac(lines)
+
+    assert len(find_stage_chain(almanac, "seed", "location")) == 7
+    assert len(find_stage_chain(almanac, "water", "location")) == 4
+    # the shortest chain to the plot skips the rest of the stages
+    assert len(find_stage_chain(almanac, "seed", "plot")) == 2
+
+    stages = [get_stage_entries(stage_index) for stage_index in find_stage_chain(almanac, "seed", "location")]
+    assert stages[0] == [(52, 50, 48), (50, 98, 2)]
+    assert get_lowest_location_by_ranges(seeds, stages) == 46
+
+def test_almanac_cache():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        input_file = os.path.join(cache_dir, "almanac.txt")
+        with open(input_file, "w") as file:
+            file.write("seeds: 79 14 55 13\n\nseed-to-soil map:\n50 98 2\n52 50 48\n\nsoil-to-location map:\n0 15 37\n")
+
+        # the second load comes from the memory, without parsing again
+        almanac = load_almanac(input_file, cache_dir)
+        assert load_almanac(input_file, cache_dir) is almanac
+
+        # a fresh run loads the snapshot instead
+        input_hash = hash_input_file(input_file)
+        assert os.path.exists(os.path.join(cache_dir, f"{input_hash}.almanac"))
+        del ALMANAC_CACHE[input_hash]
+        assert load_almanac(input_file, cache_dir) == almanac
+
+        seeds, stages = load_stages(input_file, cache_dir=cache_dir)
+        assert seeds == [range(79, 93), range(55, 68)]
+        assert get_location(79, stages) == 81
+
+def test_compose_almanac():
+    stages = EXAMPLE_STAGES
+    location_map = compose_almanac(stages)
+    seed_map = compose_almanac(invert_stages(stages))
+
+    for number in range(120):
+        assert apply_piecewise_map(location_map, number) == get_location(number, stages)
+        assert apply_piecewise_map(seed_map, number) == get_seed(number, stages)
+
+def test_stage_indexes():
+    stages = EXAMPLE_STAGES
+    location_indexes = [build_stage_index(mapping) for mapping in stages]
+    seed_indexes = [build_stage_index(mapping) for mapping in invert_stages(stages)]
+
+    for number in range(120):
+        assert walk_stage_indexes(number, location_indexes) == get_location(number, stages)
+        assert walk_stage_indexes(number, seed_indexes) == get_seed(number, stages)
+
+def generate_almanac(num_entries, random_seed=0):
+    """ Generates seven random maps of num_entries entries each, shaped like the puzzle ones.
+    The source ranges never overlap and some of them have gaps in-between. The destinations are the same blocks in a shuffled order.
+    """
+
+    rng = random.Random(random_seed)
+
+    stages = []
+    for _ in range(7):
+        sizes = [rng.randint(1, 1_000_000) for _ in range(num_entries)]
+
+        sources = []
+        position = 0
+        for size in sizes:
+            # leave a gap before roughly a quarter of the entries
+            if rng.random() < 0.25:
+                position += rng.randint(1, 1_000_000)
+            sources.append(position)
+            position += size
+
+        destinations = [0] * num_entries
+        position = 0
+        for entry_idx in rng.sample(range(num_entries), num_entries):
+            destinations[entry_idx] = position
+            position += sizes[entry_idx]
+
+        mapping = list(zip(destinations, sources, sizes))
+        rng.shuffle(mapping)
+        stages.append(mapping)
+
+    return stages
+
+def benchmark_lookups(num_entries, num_locations=10_000):
+    """ Times the linear scan, the bisect index of each map and the composed map over the same random locations and almanac. """
+
+    stages = generate_almanac(num_entries)
+    span = max(destination + size for mapping in stages for destination, _, size in mapping)
+    rng = random.Random(1)
+    locations = [rng.randrange(span) for _ in range(num_locations)]
+
+    start_time = time.perf_counter()
+    seed_indexes = [build_stage_index(mapping) for mapping in invert_stages(stages)]
+    seed_map = compose_almanac(invert_stages(stages))
+    print(f"Built the indexes in {time.perf_counter() - start_time:.3f}s, the composed map has {len(seed_map[0])} pieces")
+
+    lookups = [
+        ("linear", lambda location: get_seed(location, stages)),
+        ("bisect index", lambda location: walk_stage_indexes(location, seed_indexes)),
+        ("composed", lambda location: apply_piecewise_map(seed_map, location))
+    ]
+    for name, get_location_seed in lookups:
+        start_time = time.perf_counter()
+        seeds_sum = sum(get_location_seed(location) for location in locations)
+        elapsed = time.perf_counter() - start_time
+
+        print(f"{name}: seeds sum {seeds_sum}, {elapsed:.3f}s, {num_locations / elapsed:.0f} locations/s")
 
 def valid_seed(seed, seeds):
     """ Check if the seed is valid - it should be in the seeds list."""
@@ -271,45 +578,135 @@ def valid_seed(seed, seeds):
 def test_get_seed_function(args):
     """We test whether we have correctly mapped the input."""
 
-    seeds, seeds_to_soil, soil_to_fertilizer, fertilizer_to_water, water_to_light, light_to_temperature, temperature_to_humidity, humidity_to_location = parse_input_file(args.input_file)
+    seeds, stages = load_stages(args.input_file, cache_dir=args.cache_dir)
 
     locations = [529571705, 3374647, 386490336]
     expected_seeds = [280775197, 7535297, 3229061264]
 
     for idx, location in enumerate(locations):
-        seed = get_seed(location, seeds_to_soil, soil_to_fertilizer, fertilizer_to_water, water_to_light, light_to_temperature, temperature_to_humidity, humidity_to_location)
+        seed = get_seed(location, stages)
         assert expected_seeds[idx] == seed, f"Expected seed: {expected_seeds[idx]}, got: {seed}"
 
 def test_get_location_function(args):
     """We test whether we have correctly mapped the input."""
 
-    seeds, seeds_to_soil, soil_to_fertilizer, fertilizer_to_water, water_to_light, light_to_temperature, temperature_to_humidity, humidity_to_location = parse_input_file(args.input_file)
+    seeds, stages = load_stages(args.input_file, cache_dir=args.cache_dir)
 
     seeds = [280775197, 7535297, 3229061264]
     expected_location = [529571705, 3374647, 386490336]
 
     for idx, seed in enumerate(seeds):
-        location = get_location(seed, seeds_to_soil, soil_to_fertilizer, fertilizer_to_water, water_to_light, light_to_temperature, temperature_to_humidity, humidity_to_location)
+        location = get_location(seed, stages)
         assert expected_location[idx] == location, f"Expected location: {expected_location[idx]}, got: {location}"
 
+def init_scan_worker(seed_map, seeds, lowest_found):
+    """ Keeps the maps of the scan in the worker process, so they are not sent again with every chunk. """
+
+    scan_state["seed_map"] = seed_map
+    scan_state["seeds"] = seeds
+    scan_state["lowest_found"] = lowest_found
+
+def scan_location_chunk(start, end):
+    """ Returns the lowest (location, seed) in [start, end) with a valid seed, or None.
+    Gives up as soon as another worker found a seed below start, since this chunk can no longer hold the lowest location.
+    """
+
+    seed_map = scan_state["seed_map"]
+    seeds = scan_state["seeds"]
+    lowest_found = scan_state["lowest_found"]
+
+    for check_start in range(start, end, SCAN_CHECK_INTERVAL):
+        if lowest_found.value < start:
+            return None
+
+        for location in range(check_start, min(check_start + SCAN_CHECK_INTERVAL, end)):
+            seed = apply_piecewise_map(seed_map, location)
+            if valid_seed(seed, seeds):
+                with lowest_found.get_lock():
+                    lowest_found.value = min(lowest_found.value, location)
+                return location, seed
+
+    return None
+
+def find_lowest_location_parallel(seeds, stages, workers, chunk_size=SCAN_CHUNK_SIZE):
+    """ Scans the locations from 0 upwards in ordered chunks on a pool of worker processes and returns the lowest (location, seed).
+    Only a few chunks per worker are in flight, and their results are collected in order - so the first hit is the lowest location.
+    Once it is found, the chunks that did not start yet are cancelled and the running ones stop at their next check.
+    Like the serial search, this relies on the maps going back one to one, and returns None if no location leads to a valid seed.
+    """
+
+    seed_map = compose_almanac(invert_stages(stages))
+    location_map = compose_almanac(stages)
+
+    # the location of any seed bounds the scan, so it always ends with a hit
+    scan_end = min(apply_piecewise_map(location_map, seed_range.start) for seed_range in seeds if seed_range) + 1
+    lowest_found = multiprocessing.Value('q', scan_end)
+
+    chunk_starts = iter(range(0, scan_end, chunk_size))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_scan_worker, initargs=(seed_map, seeds, lowest_found)) as executor:
+        submit_chunk = lambda chunk_start: executor.submit(scan_location_chunk, chunk_start, min(chunk_start + chunk_size, scan_end))
+
+        # a few chunks per worker, so a worker that finishes early has the next one waiting
+        pending = deque(submit_chunk(chunk_start) for chunk_start in islice(chunk_starts, workers * 4))
+        while pending:
+            result = pending.popleft().result()
+            if result is not None:
+                for future in pending:
+                    future.cancel()
+                return result
+
+            chunk_start = next(chunk_starts, None)
+            if chunk_start is not None:
+                pending.append(submit_chunk(chunk_start))
+
+    return None
+
+def test_scan_parallel():
+    stages = EXAMPLE_STAGES
+    seeds = [range(79, 79+14), range(55, 55+13)]
+
+    for chunk_size in [1, 7, 100]:
+        assert find_lowest_location_parallel(seeds, stages, workers=2, chunk_size=chunk_size) == (46, 82)
+
 def main(args):
-    seeds, seeds_to_soil, soil_to_fertilizer, fertilizer_to_water, water_to_light, light_to_temperature, temperature_to_humidity, humidity_to_location = parse_input_file(args.input_file)
+    if args.benchmark:
+        benchmark_lookups(args.benchmark)
+        return
+
+    seeds, stages = load_stages(args.input_file, args.source, args.destination, args.cache_dir)
+
+    if args.ranges:
+        print(f"Lowest location found: {get_lowest_location_by_ranges(seeds, stages)}")
+        return
+
+    if args.workers > 1:
+        result = find_lowest_location_parallel(seeds, stages, args.workers)
+        if result is None:
+            print("No location found")
+            return
+
+        location, found_seed = result
+        print(f"Lowest location found: {location}, seed: {found_seed}")
+        return
+
 
+    # Compose the maps back from the location to the seed once, so every location is a single lookup
+    seed_map = compose_almanac(invert_stages(stages))
 
-    # Order the location list by destination to start from the lowest location
-    humidity_to_location.sort(key=lambda x: x[0])
+    # Order the last map by destination to start from the lowest location
+    last_stage = sorted(stages[-1], key=lambda x: x[0])
     # We can do the reverse approach - we start from the location and go backwards
-    for location_start, _, location_end in humidity_to_location:
+    for location_start, _, location_end in last_stage:
 
         # perform binary search to find the range of the lowest location
-        end_location_seed = get_seed(location_end, seeds_to_soil, soil_to_fertilizer, fertilizer_to_water, water_to_light, light_to_temperature, temperature_to_humidity, humidity_to_location)
+        end_location_seed = apply_piecewise_map(seed_map, location_end)
 
         # Check the location end - if it's not in the seed number - continue to the next
         if not valid_seed(end_location_seed, seeds):
             continue
 
         for location in range(location_start, location_end):
-            found_seed = get_seed(location, seeds_to_soil, soil_to_fertilizer, fertilizer_to_water, water_to_light, light_to_temperature, temperature_to_humidity, humidity_to_location)
+            found_seed = apply_piecewise_map(seed_map, location)
 
             if valid_seed(found_seed, seeds):
                 print(f"Lowest location found: {location}, seed: {found_seed}")
@@ -318,8 +715,15 @@ def main(args):
 
 if __name__ == "__main__":
     args = parse_arguments()
-    test_get_location_function(args)
-    print("Successfully passed get_location function unit test.")
-    test_get_seed_function(args)
-    print("Successfully passed get_seed function unit test.")
+    if args.self_test:
+        test_map_ranges()
+        test_parse_almanac()
+        test_almanac_cache()
+        test_compose_almanac()
+        test_stage_indexes()
+        test_scan_parallel()
+        test_get_location_function(args)
+        print("Successfully passed get_location function unit test.")
+        test_get_seed_function(args)
+        print("Successfully passed get_seed function unit test.")
     main(args)
\ No newline at end of file
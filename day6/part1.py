@@ -1,12 +1,27 @@
 """Day 6:  Wait For It
 The idea of this puzzle is to record the number of ways you can beat the boat race.
+
+Rather than trying every holding time, we solve for the interval of holding times that beat the distance (see part 2),
+so every race costs the same however long it is. With NumPy, whole arrays of races are scored at once.
 """
 
 import argparse
+import math
+import random
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# the largest races the batch solver can take in int64, where Time^2 and 4*Distance both still fit
+INT64_MAX_TIME = math.isqrt(2**63 - 1)
+INT64_MAX_DISTANCE = (2**63 - 1) // 4
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Process input file')
     parser.add_argument('--input_file', type=str, help='Path to the input file')
+    parser.add_argument('--numpy', action='store_true', help='Score all the races at once with vectorized NumPy operations')
     return parser.parse_args()
 
 def calculate_num_ways(time, distance):
@@ -15,8 +30,32 @@ def calculate_num_ways(time, distance):
     If you hold the button for 1 milisecond, you will move 1 millimeter per milisecond.
     If you hold the button for 2 miliseconds, you will move 2 millimeters per milisecond and so on.
     The goal is to count how many ways you can go over the distance in the given time.
+
+    The holding times that beat the distance are the integers strictly between the roots of
+    Time_holding_button^2 - Time_holding_button * Time + Distance = 0, so we only need the first one of them.
+    The integer square root estimates it up to a step, which we correct, and the last one mirrors it around Time / 2.
     """
-    
+
+    # even the best holding time (half of the race) does not beat the distance
+    best_hold = time // 2
+    if best_hold * (time - best_hold) <= distance:
+        return 0
+
+    a = (time - math.isqrt(time**2 - 4 * distance)) // 2
+
+    # correct the estimate - at most a step or two either way
+    while a * (time - a) <= distance:
+        a += 1
+    while a > 0 and (a - 1) * (time - a + 1) > distance:
+        a -= 1
+
+    b = time - a
+
+    return b - a + 1 # add 1 because we want to include the endpoints
+
+def calculate_num_ways_brute_force(time, distance):
+    """Counts the ways to beat the boat by trying every holding time. Only usable for small races."""
+
     num_ways = 0
 
     for t in range(time):
@@ -28,6 +67,92 @@ def calculate_num_ways(time, distance):
 
     return num_ways
 
+def calculate_num_ways_batch(times, distances):
+    """Counts the ways to beat the boat for arrays of races at once, with the same root bounds as calculate_num_ways.
+    The square root is taken in floats and the estimate is then corrected on the integers, which is exact while Time^2 fits in an int64.
+    The few races past that (Time above INT64_MAX_TIME or Distance outside [0, INT64_MAX_DISTANCE]) are counted one by one
+    with the exact calculate_num_ways instead, and the counts are then returned as an object array of Python ints.
+    """
+
+    if np is None:
+        raise ImportError("The --numpy mode requires numpy to be installed")
+
+    try:
+        times = np.asarray(times, dtype=np.int64)
+        distances = np.asarray(distances, dtype=np.int64)
+    except OverflowError:
+        # some of the numbers do not even fit in an int64
+        return np.array([calculate_num_ways(int(time), int(distance)) for time, distance in zip(times, distances)], dtype=object)
+
+    in_range = (times >= 0) & (times <= INT64_MAX_TIME) & (distances >= 0) & (distances <= INT64_MAX_DISTANCE)
+    if not in_range.all():
+        num_ways = calculate_num_ways_batch(np.where(in_range, times, 0), np.where(in_range, distances, 0)).astype(object)
+        for race_idx in np.flatnonzero(~in_range):
+            num_ways[race_idx] = calculate_num_ways(int(times[race_idx]), int(distances[race_idx]))
+        return num_ways
+
+    discriminant = times * times - 4 * distances
+    a = (times - np.floor(np.sqrt(np.maximum(discriminant, 0))).astype(np.int64)) // 2
+
+    # correct the estimate - the float square root can put it a step further than the integer one
+    for _ in range(3):
+        a += a * (times - a) <= distances
+    for _ in range(3):
+        a -= (a > 0) & ((a - 1) * (times - a + 1) > distances)
+
+    # races where even the best holding time does not beat the distance
+    best_hold = times // 2
+    winnable = best_hold * (times - best_hold) > distances
+
+    return np.where(winnable, times - 2 * a + 1, 0)
+
+def multiply_num_ways(num_ways):
+    """Multiplies an array of counts exactly, pairing them up level by level so the big integers stay balanced.
+    Each level is a single NumPy operation on Python integers, so there is no Python loop per race.
+    """
+
+    values = np.asarray(num_ways).astype(object)
+    if values.size == 0:
+        return 1
+
+    while values.size > 1:
+        if values.size % 2:
+            values = np.append(values, 1)
+        values = values[0::2] * values[1::2]
+
+    return int(values[0])
+
+def test_calculate_num_ways():
+    times = [7, 15, 30]
+    distances = [9, 40, 200]
+    assert [calculate_num_ways(time, distance) for time, distance in zip(times, distances)] == [4, 8, 9]
+
+    rng = random.Random(0)
+    for _ in range(2000):
+        time = rng.randint(0, 200)
+        distance = rng.randint(0, time**2 // 4 + 2)
+        assert calculate_num_ways(time, distance) == calculate_num_ways_brute_force(time, distance), (time, distance)
+
+def test_calculate_num_ways_batch():
+    assert calculate_num_ways_batch([7, 15, 30], [9, 40, 200]).tolist() == [4, 8, 9]
+    assert multiply_num_ways(calculate_num_ways_batch([7, 15, 30], [9, 40, 200])) == 288
+
+    rng = np.random.default_rng(0)
+    times = rng.integers(0, 3_000_000_000, size=10_000)
+    distances = rng.integers(0, times**2 // 4 + 2)
+    expected = [calculate_num_ways(time, distance) for time, distance in zip(times.tolist(), distances.tolist())]
+    assert calculate_num_ways_batch(times, distances).tolist() == expected
+
+    # across the bounds of int64, where the races fall back to the exact solver
+    times = [INT64_MAX_TIME, INT64_MAX_TIME + 1, 4_000_000_000, 4_000_000_000, 2**62, 2**62]
+    distances = [10, 10, 10, INT64_MAX_DISTANCE + 1, 2**100, INT64_MAX_DISTANCE]
+    expected = [calculate_num_ways(time, distance) for time, distance in zip(times, distances)]
+    assert calculate_num_ways_batch(times, distances).tolist() == expected
+    assert calculate_num_ways_batch([10**30, 7], [10**50, 9]).tolist() == [calculate_num_ways(10**30, 10**50), 4]
+
+    num_ways = rng.integers(0, 1000, size=1001)
+    assert multiply_num_ways(num_ways) == math.prod(num_ways.tolist())
+
 def main():
 
     args = parse_arguments()
@@ -43,6 +168,11 @@ def main():
                 distances = [int(n) for n in line.strip().split()[1:] if n.isdigit()]
 
     assert len(times) == len(distances), "Times and distances need to be the same length"
+
+    if args.numpy:
+        total_ways = multiply_num_ways(calculate_num_ways_batch(times, distances))
+        print("Total number of ways to beat the boat: {}".format(total_ways))
+        return
     
     total_ways = 1
     for time, distance in zip(times, distances):
@@ -54,4 +184,7 @@ def main():
 
 
 if __name__ == "__main__":
+    test_calculate_num_ways()
+    if np is not None:
+        test_calculate_num_ways_batch()
     main()
\ No newline at end of file
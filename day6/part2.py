@@ -2,14 +2,17 @@
 The idea of this puzzle is to record the number of ways you can beat the boat race.
 
 Part 2: You can improve the algorithm by just computing the intervals of how long you press the button for.
+The interval is computed with integer arithmetic only, so it stays exact for races of any size.
 """
 
 import argparse
+import random
 import math
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Process input file')
     parser.add_argument('--input_file', type=str, help='Path to the input file')
+    parser.add_argument('--fuzz', type=int, metavar='CASES', help='Check the solver against the brute force on this many random small races instead of solving the input')
     return parser.parse_args()
 
 def calculate_num_ways(time, distance):
@@ -42,19 +45,79 @@ def calculate_num_ways(time, distance):
 
     Thus you need to hold the button for at least A and at most B.
 
-    Thus to calculate exact integers, we ceil(A) and floor(B), then count the difference B-A.
+    Thus to calculate exact integers, we find the smallest integer above A, and B mirrors it around Time / 2.
 
+    Floats lose precision once Time^2 - 4*Distance goes past 2^53, so we take the integer square root instead.
+    That only estimates A up to a step, so we move the estimate until it is the first holding time that beats the distance.
     """
-    
-    a = math.ceil(0.5 * (time - math.sqrt(time**2 - 4 * distance)))
-    b = math.floor(0.5 * (time + math.sqrt(time**2 - 4 * distance)))
+
+    # even the best holding time (half of the race) does not beat the distance
+    best_hold = time // 2
+    if best_hold * (time - best_hold) <= distance:
+        return 0
+
+    a = (time - math.isqrt(time**2 - 4 * distance)) // 2
+
+    # correct the estimate - at most a step or two either way
+    while a * (time - a) <= distance:
+        a += 1
+    while a > 0 and (a - 1) * (time - a + 1) > distance:
+        a -= 1
+
+    b = time - a
 
     return b - a + 1 # add 1 because we want to include the endpoints
 
+def calculate_num_ways_brute_force(time, distance):
+    """Counts the ways to beat the boat by trying every holding time, like part 1 does. Only usable for small races."""
+
+    num_ways = 0
+
+    for t in range(time):
+        hold_for = t
+        speed = hold_for
+        distance_covered = speed * (time - hold_for)
+        if distance_covered > distance:
+            num_ways += 1
+
+    return num_ways
+
+def fuzz_calculate_num_ways(num_cases, max_time=200, random_seed=0):
+    """Compares calculate_num_ways against the brute force on random small races, and asserts on the first mismatch."""
+
+    rng = random.Random(random_seed)
+
+    for _ in range(num_cases):
+        time = rng.randint(0, max_time)
+        # the distances around the record the race can reach are where the rounding goes wrong
+        distance = rng.randint(0, time**2 // 4 + 2)
+
+        num_ways = calculate_num_ways(time, distance)
+        expected = calculate_num_ways_brute_force(time, distance)
+        assert num_ways == expected, f"Time {time}, distance {distance}: expected {expected}, got {num_ways}"
+
+def test_calculate_num_ways():
+    assert calculate_num_ways(71530, 940200) == 71503
+    # the roots are whole numbers - holding for exactly 10 or 20 only ties the distance
+    assert calculate_num_ways(30, 200) == 9
+    assert calculate_num_ways(3, 2) == 0
+
+    # far past the precision of floats, with the distance reached by holding for exactly hold_for
+    time = 10**40 + 7
+    for hold_for in [1, 12345, 10**20, time // 2 - 1]:
+        assert calculate_num_ways(time, hold_for * (time - hold_for)) == time - 2 * hold_for - 1
+
+    fuzz_calculate_num_ways(2000)
+
 def main():
 
     args = parse_arguments()
 
+    if args.fuzz:
+        fuzz_calculate_num_ways(args.fuzz)
+        print(f"Checked {args.fuzz} random races against the brute force")
+        return
+
     with open(args.input_file, "r") as input_file:
         for line in input_file:
             if line.startswith("Time"):
@@ -67,4 +130,5 @@ def main():
     print("Total number of ways to beat the boat: {}".format(num_ways))
 
 if __name__ == "__main__":
+    test_calculate_num_ways()
     main()
\ No newline at end of file